@@ -1,42 +1,246 @@
 import subprocess
 import os
+import threading
+from .tracing import NULL_TRACER
+
+def _label(cmd):
+    """Short span name: 'adb pull', 'adb shell find'..."""
+    args = cmd[3:] if len(cmd) > 2 and cmd[1] == "-s" else cmd[1:]
+    if args and args[0] in ("shell", "exec-out") and len(args) > 1:
+        return f"adb {args[0]} {args[1]}"
+    return f"adb {args[0]}" if args else "adb"
+
+def _startupinfo():
+    startupinfo = None
+    if os.name == 'nt':
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+class AdbStream:
+    """Iterates stdout lines of a running adb command as they arrive.
+    returncode is set once iteration has finished."""
+    def __init__(self, wrapper, cmd):
+        self.wrapper = wrapper
+        self.cmd = cmd
+        self.returncode = None
+
+    def __iter__(self):
+        span = self.wrapper.tracer.span(_label(self.cmd), "adb", cmd=" ".join(self.cmd))
+        span.__enter__()
+        try:
+            proc = self.wrapper._spawn(self.cmd, stderr=subprocess.DEVNULL, text=True, encoding='utf-8', errors='replace')
+        except Exception:
+            proc = None
+        if proc is None:
+            self.returncode = 1
+            span.set(exit=1)
+            span.__exit__(None, None, None)
+            return
+        lines = 0
+        try:
+            for line in proc.stdout:
+                lines += 1
+                yield line.rstrip("\r\n")
+        finally:
+            proc.stdout.close()
+            self.returncode = proc.wait()
+            self.wrapper._untrack(proc)
+            span.set(exit=self.returncode, lines=lines)
+            span.__exit__(None, None, None)
+
+class AdbRecordStream:
+    """Iterates NUL-separated fixed-field records of a running adb command,
+    parsed straight from the byte stream (no text decoding, so names with
+    newlines, '|' or non-UTF-8 bytes survive). Yields tuples of bytes."""
+    def __init__(self, wrapper, cmd, fields):
+        self.wrapper = wrapper
+        self.cmd = cmd
+        self.fields = fields
+        self.returncode = None
+
+    def __iter__(self):
+        span = self.wrapper.tracer.span(_label(self.cmd), "adb", cmd=" ".join(self.cmd))
+        span.__enter__()
+        try:
+            proc = self.wrapper._spawn(self.cmd, stderr=subprocess.DEVNULL)
+        except Exception:
+            proc = None
+        if proc is None:
+            self.returncode = 1
+            span.set(exit=1)
+            span.__exit__(None, None, None)
+            return
+        n = self.fields
+        tail = b""
+        total = 0
+        try:
+            while True:
+                chunk = proc.stdout.read1(65536) if hasattr(proc.stdout, "read1") else proc.stdout.read(65536)
+                if not chunk: break
+                total += len(chunk)
+                parts = (tail + chunk).split(b"\0")
+                tail = parts.pop()
+                # Only hand out whole records; a partial one waits for the next chunk
+                whole = len(parts) - len(parts) % n
+                for i in range(0, whole, n):
+                    yield tuple(parts[i:i + n])
+                if whole < len(parts):
+                    tail = b"\0".join(parts[whole:] + [tail])
+        finally:
+            proc.stdout.close()
+            self.returncode = proc.wait()
+            self.wrapper._untrack(proc)
+            span.set(exit=self.returncode, bytes=total)
+            span.__exit__(None, None, None)
+
+def decode_name(raw):
+    """Device file name bytes -> str. Undecodable bytes are kept as surrogates,
+    so os.fsencode() / subprocess give back the exact original bytes."""
+    return raw.decode("utf-8", "surrogateescape")
+
+def shell_quote(text):
+    """One device shell word for `text`: single-quoted, with ' written as '\\''
+    (a name like "Mom's party.jpg" is data, never shell syntax)."""
+    return "'" + text.replace("'", "'\\''") + "'"
 
 class AdbWrapper:
-    def __init__(self, adb_path, debug=False, logger=None):
+    def __init__(self, adb_path, debug=False, logger=None, tracer=None):
         self.adb = adb_path
         self.debug = debug
         self.logger = logger
+        self.tracer = tracer or NULL_TRACER
+        # Live child processes, so cancel() can kill an in-flight pull
+        self._procs = set()
+        self._lock = threading.Lock()
+        self.cancelled = threading.Event()
+        # Pin commands to one device once a run has picked it (adb -s)
+        self.serial = None
 
-    def run(self, args):
-        startupinfo = None
-        if os.name == 'nt':
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        
-        cmd = [self.adb] + args
+    def _cmd(self, args):
+        cmd = [self.adb] + (["-s", self.serial] if self.serial else []) + args
         if self.debug and self.logger:
             self.logger(f"[DEBUG] CMD: {' '.join(cmd)}")
-            
+        return cmd
+
+    def _spawn(self, cmd, **kwargs):
+        """Starts a tracked process. Returns None if cancelled; spawn errors propagate."""
+        with self._lock:
+            if self.cancelled.is_set(): return None
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, startupinfo=_startupinfo(), **kwargs)
+            self._procs.add(proc)
+        return proc
+
+    def _untrack(self, proc):
+        with self._lock:
+            self._procs.discard(proc)
+
+    def cancel(self):
+        """Kills every running command of this wrapper; new ones fail until reset_cancel()."""
+        with self._lock:
+            self.cancelled.set()
+            procs = list(self._procs)
+        for proc in procs:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def reset_cancel(self):
+        self.cancelled.clear()
+
+    def stream(self, args):
+        """Like run(), but yields output lines while the command is still running."""
+        return AdbStream(self, self._cmd(args))
+
+    def stream_records(self, args, fields):
+        """Binary streaming mode: yields NUL-separated records of `fields` byte strings."""
+        return AdbRecordStream(self, self._cmd(args), fields)
+
+    def list_dir_records(self, remote_dir):
+        """Lists regular files of one folder as (mtime, size, name) byte records,
+        NUL-delimited so any file name is representable. Needs find -printf
+        (toybox on Android 10+); callers fall back to stat when it yields nothing."""
+        return self.stream_records(["shell", "find", shell_quote(remote_dir), "-maxdepth", "1", "-type", "f",
+                                    "-printf", "'%T@\\0%s\\0%f\\0'"], 3)
+
+    def run(self, args):
+        cmd = self._cmd(args)
+        with self.tracer.span(_label(cmd), "adb", cmd=" ".join(cmd)) as span:
+            res = self._run(cmd, args)
+            span.set(exit=res.returncode, bytes=len(res.stdout))
+        return res
+
+    def _run(self, cmd, args):
         try:
-            return subprocess.run(
-                cmd, 
-                capture_output=True, 
-                text=True, 
-                encoding='utf-8', 
-                errors='replace', 
-                startupinfo=startupinfo
-            )
+            proc = self._spawn(cmd, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
         except FileNotFoundError:
             # Graceful fail if adb.exe is missing/path is wrong
             return subprocess.CompletedProcess(args, 1, stdout="", stderr="ADB binary not found")
         except Exception as e:
             return subprocess.CompletedProcess(args, 1, stdout="", stderr=str(e))
+        if proc is None:
+            return subprocess.CompletedProcess(args, -9, stdout="", stderr="Cancelled")
+        try:
+            out, err = proc.communicate()
+        except Exception as e:
+            return subprocess.CompletedProcess(args, 1, stdout="", stderr=str(e))
+        finally:
+            self._untrack(proc)
+        return subprocess.CompletedProcess(args, proc.returncode, stdout=out, stderr=err)
+
+    def read_bytes(self, args):
+        """Runs an adb command and returns raw stdout bytes (b"" on failure)."""
+        cmd = self._cmd(args)
+        with self.tracer.span(_label(cmd), "adb", cmd=" ".join(cmd)) as span:
+            try:
+                proc = self._spawn(cmd, stderr=subprocess.DEVNULL)
+            except Exception:
+                span.set(exit=1)
+                return b""
+            if proc is None: return b""
+            try:
+                out, _ = proc.communicate()
+            finally:
+                self._untrack(proc)
+            span.set(exit=proc.returncode, bytes=len(out))
+        return out if proc.returncode == 0 else b""
+
+    def start_server(self):
+        """Spawns the adb server daemon (no-op if it is already running)."""
+        res = self.run(["start-server"])
+        return res.returncode == 0
 
     def remote_exists(self, path):
         """Checks if a path exists on the device."""
-        res = self.run(["shell", "ls", "-d", f"'{path}'"])
+        res = self.run(["shell", "ls", "-d", shell_quote(path)])
         return res.returncode == 0
 
+    def get_serial(self):
+        """Serial of the single connected device, or None."""
+        res = self.run(["get-serialno"])
+        serial = res.stdout.strip()
+        if res.returncode != 0 or not serial or serial == "unknown": return None
+        return serial
+
+    def get_transport(self):
+        """'usb' or 'wifi' for the pinned (or only) device, from 'adb devices -l'."""
+        res = self.run(["devices", "-l"])
+        for line in res.stdout.splitlines()[1:]:
+            parts = line.split()
+            if len(parts) < 2 or parts[1] != "device": continue
+            if self.serial and parts[0] != self.serial: continue
+            if any(p.startswith("usb:") for p in parts[2:]): return "usb"
+            # Wireless debugging: ip:port or mDNS service names
+            if ":" in parts[0] or "._adb-tls" in parts[0]: return "wifi"
+            return "usb"
+        return "unknown"
+
+    def is_online(self):
+        """True if the (pinned) device is attached and in 'device' state."""
+        res = self.run(["get-state"])
+        return res.returncode == 0 and res.stdout.strip() == "device"
+
     def get_state(self):
         """Returns: 'Connected', 'Unauthorized', 'Offline', 'No Device', or 'Error'"""
         res = self.run(["devices"])
@@ -0,0 +1,183 @@
+import os
+import json
+import shutil
+import tarfile
+import threading
+from .hashing import md5_hex, file_md5
+
+INDEX_SUFFIX = ".idx"
+BLOCK = tarfile.BLOCKSIZE
+
+def _padded(n):
+    return (n + BLOCK - 1) // BLOCK * BLOCK
+
+def read_index(index_path):
+    """Yields (name, size, data_offset) of one archive index; a torn last line is
+    ignored, and so is any member the tar itself does not reach (cut off)."""
+    try:
+        tar_size = os.path.getsize(index_path[:-len(INDEX_SUFFIX)])
+    except OSError:
+        tar_size = 0
+    try:
+        with open(index_path, "r", encoding="utf-8", errors="surrogateescape") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    name, size, data = rec["name"], rec["size"], rec["data"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if data + size <= tar_size: yield name, size, data
+    except OSError:
+        return
+
+class MonthArchive:
+    """One uncompressed tar per month plus a JSON-lines index of its members.
+
+    Members are only ever appended. The index line is written after the data
+    is on disk, so the index is the source of truth: on open, anything past
+    the last indexed member (a crash mid-append, the end-of-archive blocks of
+    the previous run) is cut off and overwritten. Lookups never touch the tar."""
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.lock = threading.Lock()
+        self.members = {}
+        end = 0
+        if not os.path.exists(path):
+            # An index without its tar describes nothing
+            if os.path.exists(self.index_path): os.remove(self.index_path)
+        elif not os.path.exists(self.index_path):
+            self._rebuild_index()
+        lines = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8", errors="surrogateescape") as f:
+                lines = sum(1 for _ in f)
+        for name, size, data in read_index(self.index_path):
+            self.members[name] = (size, data)
+            end = max(end, data + _padded(size))
+        if lines > len(self.members):
+            # Entries past the end of the tar (or torn / superseded lines): rewrite
+            # the index, so nothing points into space the next append reuses
+            self._write_index()
+        self.f = open(path, "r+b" if os.path.exists(path) else "w+b")
+        self.f.truncate(end)
+        self.f.seek(end)
+        self.index = open(self.index_path, "a", encoding="utf-8", errors="surrogateescape")
+
+    def _rebuild_index(self):
+        """Index lost: recover it from the tar headers (the only full read of the tar)."""
+        with open(self.index_path, "w", encoding="utf-8", errors="surrogateescape") as out:
+            try:
+                with tarfile.open(self.path, "r:", encoding="utf-8", errors="surrogateescape") as tar:
+                    for info in tar:
+                        if info.isfile():
+                            out.write(json.dumps({"name": info.name, "size": info.size, "data": info.offset_data}) + "\n")
+            except (tarfile.TarError, OSError):
+                pass
+
+    def _write_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8", errors="surrogateescape") as out:
+            for name, (size, data) in self.members.items():
+                out.write(json.dumps({"name": name, "size": size, "data": data}) + "\n")
+        os.replace(tmp, self.index_path)
+
+    def _same_content(self, name, src_path):
+        """True if the member holds exactly the bytes of src_path."""
+        return md5_hex(self.read_member(name)) == file_md5(src_path)
+
+    def get(self, name):
+        """Size of a member, or None."""
+        entry = self.members.get(name)
+        return entry[0] if entry else None
+
+    def add(self, src_path, name, mtime=None):
+        """Appends a file. Returns the member name used: a member with the same
+        name and the same bytes is reused, a different one gets a new name."""
+        size = os.path.getsize(src_path)
+        with self.lock:
+            existing = self.get(name)
+            # Name + size alone is not proof: the bytes are compared before skipping
+            if existing == size and self._same_content(name, src_path): return name
+            if existing is not None:
+                base, ext = os.path.splitext(name)
+                n = 1
+                while f"{base}_{n}{ext}" in self.members:
+                    candidate = f"{base}_{n}{ext}"
+                    if self.get(candidate) == size and self._same_content(candidate, src_path): return candidate
+                    n += 1
+                name = f"{base}_{n}{ext}"
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(mtime if mtime is not None else os.path.getmtime(src_path))
+            header = info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+            start = self.f.tell()
+            try:
+                self.f.write(header)
+                with open(src_path, "rb") as src:
+                    shutil.copyfileobj(src, self.f, 1024 * 1024)
+                self.f.write(b"\0" * (_padded(size) - size))
+                self.f.flush()
+                os.fsync(self.f.fileno())
+            except OSError:
+                # Leave the tar as it was before this member
+                self.f.seek(start)
+                self.f.truncate(start)
+                raise
+            data = start + len(header)
+            self.index.write(json.dumps({"name": name, "size": size, "data": data}) + "\n")
+            self.index.flush()
+            self.members[name] = (size, data)
+            return name
+
+    def read_member(self, name, block=1024 * 1024):
+        """Yields the bytes of one member straight from its offset (no extraction)."""
+        size, data = self.members[name]
+        with open(self.path, "rb") as f:
+            f.seek(data)
+            while size > 0:
+                chunk = f.read(min(block, size))
+                if not chunk: break
+                size -= len(chunk)
+                yield chunk
+
+    def close(self):
+        """Writes the end-of-archive blocks; the next open cuts them off again."""
+        with self.lock:
+            end = self.f.tell()
+            self.f.write(b"\0" * (2 * BLOCK))
+            self.f.truncate(end + 2 * BLOCK)
+            self.f.close()
+            self.index.close()
+
+class ArchiveSet:
+    """Month archives (<root>/YYYY-MM.tar) of one destination, opened on first use."""
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.open = {}
+
+    def archive(self, month):
+        with self.lock:
+            arc = self.open.get(month)
+            if arc is None:
+                os.makedirs(self.root, exist_ok=True)
+                arc = self.open[month] = MonthArchive(os.path.join(self.root, f"{month}.tar"))
+            return arc
+
+    def store(self, src_path, name, date, mtime=None):
+        """Packs a file into its month. Returns a reference '<archive>::<member>'."""
+        arc = self.archive(date.strftime("%Y-%m"))
+        return f"{arc.path}::{arc.add(src_path, name, mtime)}"
+
+    def lookup(self, ref):
+        """(archive, member name) of a reference returned by store()."""
+        path, name = ref.split("::", 1)
+        month = os.path.basename(path)[:-len(".tar")]
+        return self.archive(month), name
+
+    def close(self):
+        with self.lock:
+            for arc in self.open.values():
+                arc.close()
+            self.open = {}
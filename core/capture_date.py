@@ -0,0 +1,220 @@
+import os
+import json
+import mmap
+import struct
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .adb import shell_quote
+
+DATE_CACHE_FILE = "osk_datecache.json"
+
+# Only this much of a file is ever touched when looking for EXIF in HEIC,
+# and when reading headers from the device.
+HEAD_BYTES = 256 * 1024
+MP4_EPOCH_OFFSET = 2082844800  # seconds between 1904-01-01 and 1970-01-01
+
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+
+def _parse_exif_datetime(raw):
+    try:
+        txt = raw.split(b"\x00", 1)[0].decode("ascii").strip()
+        return datetime.datetime.strptime(txt, "%Y:%m:%d %H:%M:%S")
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+def _read_ifd(buf, base, offset, endian):
+    """Yields (tag, type, count, value_offset_field_pos) for one TIFF IFD."""
+    if base + offset + 2 > len(buf): return
+    count = struct.unpack_from(endian + "H", buf, base + offset)[0]
+    pos = base + offset + 2
+    for _ in range(min(count, 512)):
+        if pos + 12 > len(buf): return
+        tag, typ, n = struct.unpack_from(endian + "HHI", buf, pos)
+        yield tag, typ, n, pos + 8
+        pos += 12
+
+def parse_tiff_date(buf, base):
+    """Reads DateTimeOriginal (or DateTime) from a TIFF/EXIF block at `base`."""
+    order = bytes(buf[base:base + 2])
+    if order == b"II": endian = "<"
+    elif order == b"MM": endian = ">"
+    else: return None
+    ifd0 = struct.unpack_from(endian + "I", buf, base + 4)[0]
+
+    fallback = None
+    exif_ifd = None
+    for tag, typ, n, field in _read_ifd(buf, base, ifd0, endian):
+        if tag == TAG_EXIF_IFD:
+            exif_ifd = struct.unpack_from(endian + "I", buf, field)[0]
+        elif tag == TAG_DATETIME and typ == 2 and n >= 19:
+            off = struct.unpack_from(endian + "I", buf, field)[0]
+            fallback = _parse_exif_datetime(bytes(buf[base + off:base + off + n]))
+
+    if exif_ifd:
+        for tag, typ, n, field in _read_ifd(buf, base, exif_ifd, endian):
+            if tag == TAG_DATETIME_ORIGINAL and typ == 2 and n >= 19:
+                off = struct.unpack_from(endian + "I", buf, field)[0]
+                found = _parse_exif_datetime(bytes(buf[base + off:base + off + n]))
+                if found: return found
+    return fallback
+
+def _jpeg_date(buf):
+    pos = 2
+    while pos + 4 <= len(buf):
+        if buf[pos] != 0xFF: return None
+        marker = buf[pos + 1]
+        if marker in (0xD9, 0xDA): return None  # EOI / start of scan: no more metadata
+        seg_len = struct.unpack_from(">H", buf, pos + 2)[0]
+        if marker == 0xE1 and bytes(buf[pos + 4:pos + 10]) == b"Exif\x00\x00":
+            return parse_tiff_date(buf, pos + 10)
+        pos += 2 + seg_len
+    return None
+
+def _heic_date(buf):
+    # The Exif item in HEIC is stored as '<4 byte offset>Exif\0\0<TIFF>'.
+    # Locating it properly needs iinf/iloc; in practice it sits near the start.
+    limit = min(len(buf), HEAD_BYTES)
+    pos = buf.find(b"Exif\x00\x00", 0, limit)
+    if pos < 0: return None
+    return parse_tiff_date(buf, pos + 6)
+
+def _iter_boxes(buf, start, end):
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end: return
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header: return
+        yield kind, pos + header, min(pos + size, end)
+        pos += size
+
+def _mp4_date(buf):
+    for kind, body, end in _iter_boxes(buf, 0, len(buf)):
+        if kind != b"moov": continue
+        for sub, sbody, _ in _iter_boxes(buf, body, end):
+            if sub != b"mvhd": continue
+            version = buf[sbody]
+            if version == 1:
+                secs = struct.unpack_from(">Q", buf, sbody + 4)[0]
+            else:
+                secs = struct.unpack_from(">I", buf, sbody + 4)[0]
+            if secs <= MP4_EPOCH_OFFSET: return None  # unset (0) or bogus
+            try:
+                return datetime.datetime.fromtimestamp(secs - MP4_EPOCH_OFFSET)
+            except (OverflowError, OSError, ValueError):
+                return None
+    return None
+
+def parse_capture_date(buf):
+    """Capture date from a JPEG/HEIC/MP4/MOV header buffer (bytes or mmap), or None."""
+    try:
+        if len(buf) < 12: return None
+        if buf[0] == 0xFF and buf[1] == 0xD8:
+            return _jpeg_date(buf)
+        if bytes(buf[4:8]) == b"ftyp":
+            brand = bytes(buf[8:12])
+            if brand in (b"heic", b"heix", b"mif1", b"msf1", b"hevc", b"avif"):
+                return _heic_date(buf)
+            return _mp4_date(buf)
+    except (struct.error, IndexError):
+        pass
+    return None
+
+def read_capture_date(path):
+    """Reads the capture date of a local file. The file is mapped, not read,
+    so only the header pages (and the moov box for videos) are ever loaded."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < 12: return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return parse_capture_date(mm)
+    except (OSError, ValueError):
+        return None
+
+def read_remote_capture_date(adb, remote_path):
+    """Same as read_capture_date, but only pulls the first HEAD_BYTES from the device."""
+    head = adb.read_bytes(["exec-out", "dd", "if=" + shell_quote(remote_path), f"bs={HEAD_BYTES}", "count=1", "2>/dev/null"])
+    if not head: return None
+    return parse_capture_date(head)
+
+class DateCache:
+    """Capture dates keyed by path + size + mtime, persisted between runs."""
+    def __init__(self, cache_file=DATE_CACHE_FILE):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.data = {}
+        try:
+            if os.path.exists(cache_file):
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+        except Exception:
+            self.data = {}
+
+    @staticmethod
+    def key(path, size, mtime):
+        return f"{path}|{size}|{int(mtime)}"
+
+    def get(self, key):
+        """Returns (hit, datetime-or-None)."""
+        with self.lock:
+            if key not in self.data: return False, None
+            val = self.data[key]
+        return True, (datetime.datetime.fromisoformat(val) if val else None)
+
+    def put(self, key, date):
+        with self.lock:
+            self.data[key] = date.isoformat() if date else ""
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty: return
+            try:
+                with open(self.cache_file, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f)
+                self.dirty = False
+            except Exception:
+                pass
+
+class CaptureDateResolver:
+    """Resolves capture dates through the cache, reading headers in a thread pool on a miss."""
+    def __init__(self, cache=None, workers=4):
+        self.cache = cache if cache is not None else DateCache()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def resolve(self, path, key=None):
+        """Capture date of a local file. `key` caches it under where the file
+        came from (see date_key of the sources) when `path` is only a temp copy."""
+        if key is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            key = DateCache.key(path, st.st_size, st.st_mtime)
+        hit, date = self.cache.get(key)
+        if hit: return date
+        date = read_capture_date(path)
+        self.cache.put(key, date)
+        return date
+
+    def resolve_remote(self, adb, remote_path, size, mtime):
+        """Capture date of a file still on the device, from a partial head read."""
+        key = DateCache.key("adb:" + remote_path, size, mtime)
+        hit, date = self.cache.get(key)
+        if hit: return date
+        date = read_remote_capture_date(adb, remote_path)
+        self.cache.put(key, date)
+        return date
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.cache.save()
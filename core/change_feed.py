@@ -0,0 +1,158 @@
+import time
+import threading
+import subprocess
+from .adb import AdbWrapper, decode_name, shell_quote
+from .tracing import NULL_TRACER
+
+# Device-side listing diff for phones without inotifyd: every few seconds the
+# folders are listed into a temp file on the device and only the lines that
+# were not in the previous listing go over the wire, then a "--" tick marker.
+# A file still being written shows up again with a new mtime/size next tick.
+# Names with a newline can't travel in a line diff; the next full scan gets them.
+# No single quotes in here: it is passed inside '...' to the device shell.
+POLL_SCRIPT = r"""
+t=${TMPDIR:-/data/local/tmp}/osk_feed
+: > $t.old
+nl=$(printf "\nx"); nl=${nl%x}
+while :; do
+  find DIRS -maxdepth 1 -type f ! -name "*$nl*" -printf "%T@ %s %p\n" 2>/dev/null | sort > $t.new
+  comm -13 $t.old $t.new
+  echo --
+  mv $t.new $t.old
+  sleep INTERVAL
+done
+"""
+
+class ChangeFeed(threading.Thread):
+    """Streams new files in remote folders while a live session runs.
+
+    With inotifyd on the device (toybox/busybox) the kernel reports each file
+    as it is closed after writing or renamed into place. Otherwise a
+    device-side loop diffs the listing every `interval` seconds; a file is
+    reported once it stayed unchanged for one tick. Either way only changes
+    cross USB, never repeated full listings.
+
+    on_file(folder, name, mtime, size) is called from this thread. `known`
+    maps already listed paths to their size; a path is reported again only
+    if its size changed (it was caught mid-write)."""
+    def __init__(self, adb_path, serial, folders, on_file, known=(), interval=2, stop_event=None, logger=None, tracer=None):
+        super().__init__(daemon=True)
+        self.tracer = tracer or NULL_TRACER
+        self.adb = AdbWrapper(adb_path, tracer=self.tracer)
+        self.adb.serial = serial
+        self.folders = [f.rstrip("/") for f in folders]
+        self.on_file = on_file
+        self.known = dict(known)
+        self.interval = interval
+        self.stop_event = stop_event or threading.Event()
+        self.done = threading.Event()
+        self.logger = logger
+        self.mode = None
+        # Set while the feed shell is down (device unplugged?), cleared once it answers again
+        self.down_since = None
+
+    def _log(self, msg):
+        if self.logger: self.logger(msg)
+
+    def _stopped(self):
+        return self.done.is_set() or self.stop_event.is_set()
+
+    def stop(self):
+        self.done.set()
+        self.adb.cancel()
+
+    def _emit(self, path, mtime, size):
+        if self.known.get(path) == size: return
+        folder, _, name = path.rpartition("/")
+        if folder not in self.folders or name.startswith("."): return
+        self.known[path] = size
+        self.tracer.instant("feed file", "adb", name=name, size=size)
+        self.on_file(folder, name, mtime, size)
+
+    def run(self):
+        res = self.adb.run(["shell", "command -v inotifyd"])
+        self.mode = "inotifyd" if res.returncode == 0 and res.stdout.strip() else "poll"
+        self._log(f"[LIVE] Watching {len(self.folders)} folder(s) via {self.mode}.")
+        delay = 1
+        while not self._stopped():
+            if self.mode == "inotifyd": self._follow_inotify()
+            else: self._follow_poll()
+            if self._stopped(): break
+            if self.down_since is None: self.down_since = time.time()
+            if self.done.wait(delay) or self.stop_event.is_set(): break
+            delay = min(delay * 2, 10)
+            self.adb.reset_cancel()
+
+    def _catch_up(self):
+        """After (re)starting inotifyd: files written while nobody listened."""
+        for folder in self.folders:
+            stream = self.adb.list_dir_records(folder)
+            for mtime, size, name in stream:
+                try:
+                    self._emit(f"{folder}/{decode_name(name)}", int(float(mtime)), int(size))
+                except ValueError:
+                    continue
+            if stream.returncode != 0: return False
+        return True
+
+    def _follow_inotify(self):
+        # w = closed after writing, y = moved in (camera apps write a temp name first)
+        args = ["shell", "inotifyd", "-"] + [shell_quote(f"{folder}:wy") for folder in self.folders]
+        try:
+            proc = self.adb._spawn(self.adb._cmd(args), stderr=subprocess.DEVNULL)
+        except OSError:
+            proc = None
+        if proc is None: return
+        try:
+            if not self._catch_up(): return
+            self.down_since = None
+            for raw in proc.stdout:
+                if self._stopped(): break
+                # "<event>\t<folder>\t<name>"
+                parts = raw.rstrip(b"\r\n").split(b"\t", 2)
+                if len(parts) != 3: continue
+                path = f"{decode_name(parts[1]).rstrip('/')}/{decode_name(parts[2])}"
+                res = self.adb.run(["shell", "stat", "-c", "'%Y %s'", shell_quote(path)])
+                try:
+                    mtime, size = (int(v) for v in res.stdout.split())
+                except ValueError:
+                    continue
+                self._emit(path, mtime, size)
+        finally:
+            proc.kill()
+            proc.wait()
+            self.adb._untrack(proc)
+
+    def _follow_poll(self):
+        dirs = " ".join(f'"{folder}"' for folder in self.folders)
+        script = POLL_SCRIPT.replace("DIRS", dirs).replace("INTERVAL", str(self.interval))
+        try:
+            proc = self.adb._spawn(self.adb._cmd(["shell", "sh", "-c", f"'{script}'"]), stderr=subprocess.DEVNULL)
+        except OSError:
+            proc = None
+        if proc is None: return
+        # path -> (mtime, size) reported last tick; reported again means still changing
+        pending = {}
+        seen = {}
+        try:
+            for raw in proc.stdout:
+                if self._stopped(): break
+                line = raw.rstrip(b"\r\n")
+                if line == b"--":
+                    self.down_since = None
+                    for path, (mtime, size) in pending.items():
+                        if path not in seen: self._emit(path, mtime, size)
+                    pending, seen = seen, {}
+                    continue
+                parts = line.split(b" ", 2)
+                if len(parts) != 3: continue
+                path = decode_name(parts[2])
+                try:
+                    mtime, size = int(float(parts[0])), int(parts[1])
+                except ValueError:
+                    continue
+                if self.known.get(path) != size: seen[path] = (mtime, size)
+        finally:
+            proc.kill()
+            proc.wait()
+            self.adb._untrack(proc)
@@ -0,0 +1,96 @@
+import os
+import json
+import hashlib
+from .adb import shell_quote
+
+def _load_state(state_file):
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def _save_state(state_file, state):
+    tmp = state_file + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, state_file)
+
+def _read_chunk(adb, remote_path, chunk_bytes, index):
+    return adb.read_bytes(["exec-out", "dd", "if=" + shell_quote(remote_path), f"bs={chunk_bytes}",
+                           f"skip={index}", "count=1", "2>/dev/null"])
+
+def _remote_chunk_md5(adb, remote_path, chunk_bytes, index):
+    res = adb.run(["shell", "dd", "if=" + shell_quote(remote_path), f"bs={chunk_bytes}", f"skip={index}",
+                   "count=1", "2>/dev/null", "|", "md5sum"])
+    if res.returncode != 0: return None
+    return res.stdout.split(" ", 1)[0].strip() or None
+
+def _resume_offset(part, state, chunk_bytes, hash_chunks):
+    """Bytes of the .part file we can trust: the recorded verified offset, cut back
+    to what is really on disk and, with hashing on, to the last intact chunk."""
+    have = os.path.getsize(part) if os.path.exists(part) else 0
+    offset = min(state.get("verified", 0), have)
+    offset -= offset % chunk_bytes
+    if hash_chunks and offset:
+        hashes = state.get("hashes", [])
+        with open(part, "rb") as f:
+            for i in range(offset // chunk_bytes):
+                data = f.read(chunk_bytes)
+                if i >= len(hashes) or hashlib.md5(data).hexdigest() != hashes[i]:
+                    return i * chunk_bytes
+    return offset
+
+def pull_chunked(adb, remote_path, local_path, size, mtime=None, chunk_bytes=16 * 1024 * 1024,
+                 hash_chunks=False, stop_event=None, logger=None):
+    """Pulls a large file in byte ranges (dd over exec-out) into '<local>.part'.
+    Progress is recorded in '<local>.part.json' so an interrupted pull resumes
+    from the last verified chunk. The final name only appears once complete.
+    Returns True on success."""
+    part = local_path + ".part"
+    state_file = part + ".json"
+
+    state = _load_state(state_file)
+    if not state or state.get("remote") != remote_path or state.get("size") != size or state.get("chunk") != chunk_bytes:
+        state = {"remote": remote_path, "size": size, "chunk": chunk_bytes, "verified": 0, "hashes": []}
+        if os.path.exists(part): os.remove(part)
+
+    offset = _resume_offset(part, state, chunk_bytes, hash_chunks)
+    if offset and logger: logger(f"[RESUME] {os.path.basename(local_path)} from {offset // (1024 * 1024)} MB")
+    state["verified"] = offset
+    state["hashes"] = state.get("hashes", [])[:offset // chunk_bytes]
+
+    with open(part, "ab") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        while offset < size:
+            if stop_event is not None and stop_event.is_set(): return False
+            index = offset // chunk_bytes
+            expected = min(chunk_bytes, size - offset)
+            data = _read_chunk(adb, remote_path, chunk_bytes, index)
+            if len(data) != expected:
+                if logger: logger(f"[CHUNK] Short read at {offset} ({len(data)}/{expected} bytes)")
+                return False
+
+            digest = hashlib.md5(data).hexdigest()
+            if hash_chunks:
+                remote_digest = _remote_chunk_md5(adb, remote_path, chunk_bytes, index)
+                if remote_digest != digest:
+                    if logger: logger(f"[CHUNK] Hash mismatch at chunk {index}")
+                    return False
+
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            offset += len(data)
+            state["verified"] = offset
+            state["hashes"].append(digest)
+            _save_state(state_file, state)
+
+    os.replace(part, local_path)
+    if mtime: os.utime(local_path, (mtime, mtime))
+    try:
+        os.remove(state_file)
+    except OSError:
+        pass
+    return True
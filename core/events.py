@@ -0,0 +1,122 @@
+import time
+import threading
+from collections import deque, namedtuple
+
+# --- Event types (worker -> subscribers) ---
+Log = namedtuple("Log", "msg")
+Status = namedtuple("Status", "text")
+Progress = namedtuple("Progress", "pct text")
+WiggleStart = namedtuple("WiggleStart", "")
+WiggleStop = namedtuple("WiggleStop", "")
+Jump = namedtuple("Jump", "")
+Error = namedtuple("Error", "msg")
+# complete: the whole plan was synced and verified (no stop, failure, limit or trim)
+Done = namedtuple("Done", "processed deleted elapsed complete")
+PlanDone = namedtuple("PlanDone", "text")
+Throughput = namedtuple("Throughput", "bytes_per_s")
+# records: (remote path, size, mtime or None) of the matched files, for the on-device re-check
+VerifyDone = namedtuple("VerifyDone", "total matched files records")
+DeletionDone = namedtuple("DeletionDone", "")
+# Watch mode: a device changed state ("device", "unauthorized", "offline", "gone"),
+# or a known one connected with new files (signatures are stored once synced)
+DeviceState = namedtuple("DeviceState", "serial state")
+WatchTrigger = namedtuple("WatchTrigger", "serial new_files signatures")
+
+# Only the latest of these matters to a display; older ones are dropped
+VOLATILE = (Progress, Status)
+
+class Subscription:
+    """One subscriber's buffer. publish() only appends here (or overwrites the
+    coalesced slot), so a slow subscriber never slows the worker down."""
+    def __init__(self, kinds=None, coalesce=(), batch=None):
+        self.kinds = tuple(kinds) if kinds else None
+        self.coalesce = tuple(coalesce)
+        self.batch = batch
+        self.buffer = deque()
+        self.latest = {}
+        self.lock = threading.Lock()
+
+    def offer(self, event):
+        if self.kinds is not None and not isinstance(event, self.kinds): return
+        if isinstance(event, self.coalesce):
+            with self.lock:
+                self.latest[type(event)] = event
+        else:
+            self.buffer.append(event)
+
+    def drain(self):
+        """Pending events in order (at most `batch`), then the newest coalesced ones."""
+        events = []
+        pop = self.buffer.popleft
+        try:
+            while self.batch is None or len(events) < self.batch:
+                events.append(pop())
+        except IndexError:
+            pass
+        with self.lock:
+            if self.latest:
+                events.extend(self.latest.values())
+                self.latest = {}
+        return events
+
+class EventBus:
+    """Fan-out of typed worker events to several subscribers (GUI, log file,
+    metrics...), each with its own filter, coalescing and rate."""
+    def __init__(self):
+        self.subscriptions = []
+
+    def subscribe(self, kinds=None, coalesce=(), batch=None):
+        """Pull-style: the caller drains the subscription itself (e.g. a Tk after loop)."""
+        return self.attach(Subscription(kinds, coalesce, batch))
+
+    def attach(self, subscriber):
+        """Adds any object with offer(event); it is called on the publishing thread."""
+        self.subscriptions = self.subscriptions + [subscriber]
+        return subscriber
+
+    def subscribe_thread(self, handler, kinds=None, coalesce=(), interval=0.2):
+        """Push-style: a daemon thread hands batches to handler(events) every interval."""
+        sub = self.subscribe(kinds, coalesce)
+        def pump():
+            while sub in self.subscriptions:
+                time.sleep(interval)
+                events = sub.drain()
+                if events:
+                    try:
+                        handler(events)
+                    except Exception:
+                        pass
+        threading.Thread(target=pump, daemon=True).start()
+        return sub
+
+    def unsubscribe(self, sub):
+        self.subscriptions = [s for s in self.subscriptions if s is not sub]
+
+    def publish(self, event):
+        for sub in self.subscriptions:
+            sub.offer(event)
+
+class EventCounter:
+    """Metrics subscriber: counts events per type as they are published."""
+    def __init__(self, bus):
+        self.counts = {}
+        self.lock = threading.Lock()
+        bus.attach(self)
+
+    def offer(self, event):
+        name = type(event).__name__
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self, reset=True):
+        with self.lock:
+            counts = self.counts
+            if reset: self.counts = {}
+        return counts
+
+def dispatch(handlers, events, on_unknown=None):
+    """Calls handlers[type(event)](event) for each event; unknown types go to on_unknown."""
+    for event in events:
+        handler = handlers.get(type(event))
+        if handler: handler(event)
+        elif on_unknown: on_unknown(event)
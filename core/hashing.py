@@ -0,0 +1,20 @@
+import hashlib
+
+BLOCK = 1024 * 1024
+
+def read_blocks(path, block=BLOCK):
+    """Yields the bytes of a file in blocks."""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            yield chunk
+
+def md5_hex(blocks):
+    """md5 hex digest of an iterable of byte blocks (a file, a tar member...)."""
+    md5 = hashlib.md5()
+    for chunk in blocks:
+        md5.update(chunk)
+    return md5.hexdigest()
+
+def file_md5(path):
+    """md5 hex digest of a local file; raises OSError if it can't be read."""
+    return md5_hex(read_blocks(path))
@@ -0,0 +1,92 @@
+import sys
+import datetime
+from array import array
+
+class Listing:
+    """Columnar file listing shared by the workers.
+
+    One interned name per row plus packed integer columns (mtime, size, ids
+    into small dir/mime/source tables). Rows are addressed by index, and
+    filters and sorts return index arrays instead of copying rows, so a few
+    hundred thousand files cost a few MB instead of a dict each.
+    """
+    def __init__(self):
+        self.names = []
+        self.dir_ids = array("I")
+        self.mtimes = array("q")   # seconds since epoch of the date used for sort/filter
+        self.sizes = array("q")    # -1: size not known (MediaStore row without _size)
+        self.source_ids = array("H")
+        self.mime_ids = array("H")
+        self.dirs = []
+        self._dir_index = {}
+        self.mimes = [""]
+        self._mime_index = {"": 0}
+
+    def __len__(self):
+        return len(self.names)
+
+    def _dir_id(self, directory):
+        dir_id = self._dir_index.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_index[directory] = len(self.dirs)
+            self.dirs.append(directory)
+        return dir_id
+
+    def _mime_id(self, mime):
+        mime_id = self._mime_index.get(mime)
+        if mime_id is None:
+            mime_id = self._mime_index[mime] = len(self.mimes)
+            self.mimes.append(mime)
+        return mime_id
+
+    def append(self, name, directory, mtime, size, source_id=0, mime=""):
+        self.names.append(sys.intern(name))
+        self.dir_ids.append(self._dir_id(directory))
+        self.mtimes.append(int(mtime))
+        self.sizes.append(-1 if size is None else int(size))
+        self.source_ids.append(source_id)
+        self.mime_ids.append(self._mime_id(mime))
+
+    def append_path(self, path, mtime, size, source_id=0, mime=""):
+        directory, _, name = path.rpartition("/")
+        self.append(name, directory, mtime, size, source_id, mime)
+
+    def extend(self, other):
+        """Appends every row of another listing (dir/mime ids are remapped)."""
+        dir_map = [self._dir_id(d) for d in other.dirs]
+        mime_map = [self._mime_id(m) for m in other.mimes]
+        self.names.extend(other.names)
+        self.dir_ids.extend(dir_map[d] for d in other.dir_ids)
+        self.mtimes.extend(other.mtimes)
+        self.sizes.extend(other.sizes)
+        self.source_ids.extend(other.source_ids)
+        self.mime_ids.extend(mime_map[m] for m in other.mime_ids)
+
+    # --- Row access ---
+    def path(self, i):
+        return f"{self.dirs[self.dir_ids[i]]}/{self.names[i]}"
+
+    def date(self, i):
+        try:
+            return datetime.datetime.fromtimestamp(self.mtimes[i])
+        except (OverflowError, OSError, ValueError):
+            return datetime.datetime.now()
+
+    def mime(self, i):
+        return self.mimes[self.mime_ids[i]]
+
+    def size(self, i):
+        """Size in bytes, or None if the listing did not know it."""
+        size = self.sizes[i]
+        return None if size < 0 else size
+
+    # --- Index arrays ---
+    def indices(self):
+        return array("I", range(len(self.names)))
+
+    def filter(self, idx, pred):
+        return array("I", (i for i in idx if pred(i)))
+
+    def sorted(self, idx, column, reverse=False):
+        """Sorts an index array by 'names', 'mtimes' or 'sizes'."""
+        return array("I", sorted(idx, key=getattr(self, column).__getitem__, reverse=reverse))
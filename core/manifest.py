@@ -0,0 +1,40 @@
+import os
+import json
+import threading
+
+MANIFEST_FILE = ".osk_manifest.jsonl"
+
+class Manifest:
+    """Append-only journal of finished transfers for one destination.
+    One JSON record per line; a torn last line (crash mid-write) is ignored."""
+    def __init__(self, dest_dir):
+        self.path = os.path.join(dest_dir, MANIFEST_FILE)
+        self.lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        self.entries[(rec["remote"], rec["size"])] = rec["local"]
+                    except (ValueError, KeyError):
+                        pass
+        except OSError:
+            pass
+
+    def has(self, remote_path, size):
+        """True if this exact remote file (path + size) was already synced."""
+        return (remote_path, size) in self.entries
+
+    def local_path(self, remote_path, size):
+        return self.entries.get((remote_path, size))
+
+    def record(self, remote_path, size, local_path):
+        rec = {"remote": remote_path, "size": size, "local": local_path}
+        with self.lock:
+            self.entries[(remote_path, size)] = local_path
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(rec) + "\n")
+            except OSError:
+                pass
@@ -0,0 +1,79 @@
+import heapq
+import hashlib
+from array import array
+from bisect import bisect_left
+from .archive import read_index
+
+# Entries sorted in one go before being packed into a run; bounds the
+# transient memory of the build no matter how many files are added.
+RUN_SIZE = 1 << 18
+
+def fingerprint(name, size):
+    """(64-bit key, independent 32-bit check) of one (name, size)."""
+    data = f"{name}\0{size}".encode("utf-8", "surrogateescape")
+    digest = hashlib.blake2b(data, digest_size=12).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+class FingerprintMatcher:
+    """Answers "does a local file with this (name, size) exist?" for millions of
+    files in 12 bytes per file: a sorted array of 64-bit fingerprints of
+    (name, size) plus a second, independent 32-bit hash of each.
+
+    Build it by streaming add() calls, then freeze(). A fingerprint hit is
+    confirmed by the second hash, in memory: no file system call per match,
+    and a false match would need a 96-bit collision. Members of packed month
+    archives are added from the archive index like plain files."""
+    def __init__(self, run_size=RUN_SIZE):
+        self.run_size = run_size
+        self._pending = []
+        self._runs = []
+        self.fps = array("Q")
+        self.checks = array("I")
+        self.frozen = False
+
+    def __len__(self):
+        return len(self.fps) if self.frozen else sum(len(r[0]) for r in self._runs) + len(self._pending)
+
+    def add(self, name, size):
+        # (fp, check) packed in one int so a run sorts as plain integers
+        fp, check = fingerprint(name, size)
+        self._pending.append((fp << 32) | check)
+        if len(self._pending) >= self.run_size: self._flush_run()
+
+    def add_archive(self, index_path):
+        """Adds every member of one month archive, given its index file."""
+        count = 0
+        for name, size, _ in read_index(index_path):
+            self.add(name, size)
+            count += 1
+        return count
+
+    def _flush_run(self):
+        if not self._pending: return
+        self._pending.sort()
+        fps = array("Q", (k >> 32 for k in self._pending))
+        checks = array("I", (k & 0xFFFFFFFF for k in self._pending))
+        self._runs.append((fps, checks))
+        self._pending = []
+
+    def freeze(self):
+        """Merges the sorted runs into the final arrays."""
+        self._flush_run()
+        runs, self._runs = self._runs, []
+        merged = heapq.merge(*(((fp << 32) | c for fp, c in zip(fps, checks)) for fps, checks in runs))
+        for key in merged:
+            self.fps.append(key >> 32)
+            self.checks.append(key & 0xFFFFFFFF)
+        self.frozen = True
+        return self
+
+    def memory_bytes(self):
+        return self.fps.itemsize * len(self.fps) + self.checks.itemsize * len(self.checks)
+
+    def contains(self, name, size):
+        fp, check = fingerprint(name, size)
+        j = bisect_left(self.fps, fp)
+        while j < len(self.fps) and self.fps[j] == fp:
+            if self.checks[j] == check: return True
+            j += 1
+        return False
@@ -0,0 +1,74 @@
+import datetime
+
+# MediaStore tables queried via `adb shell content query`
+MEDIA_URIS = {
+    "images": "content://media/external/images/media",
+    "video": "content://media/external/video/media",
+}
+PROJECTION = ["_data", "_size", "datetaken", "date_modified", "mime_type"]
+
+def _split_row(body):
+    """Splits 'k1=v1, k2=v2, ...' using the known projection order,
+    so commas inside paths don't break the parse."""
+    values = {}
+    pos = 0
+    for i, key in enumerate(PROJECTION):
+        start = body.find(f"{key}=", pos)
+        if start < 0: return None
+        start += len(key) + 1
+        if i + 1 < len(PROJECTION):
+            end = body.find(f", {PROJECTION[i + 1]}=", start)
+            if end < 0: return None
+        else:
+            end = len(body)
+        values[key] = body[start:end]
+        pos = end
+    return values
+
+def iter_rows(lines):
+    """Groups raw `content query` output into rows. A path containing a
+    newline continues on the next line, so rows are joined until the next 'Row:'."""
+    current = None
+    for line in lines:
+        if line.startswith("Row: "):
+            if current is not None: yield current
+            # "Row: 12 _data=..." -> drop the row number
+            current = line.split(" ", 2)[2] if line.count(" ") >= 2 else ""
+        elif current is not None:
+            current += "\n" + line
+    if current is not None: yield current
+
+def parse_row(body):
+    """Returns {'path', 'size', 'date', 'mime'} or None for unusable rows."""
+    v = _split_row(body)
+    if not v or v["_data"] in ("", "NULL"): return None
+    try:
+        size = int(v["_size"])
+    except ValueError:
+        size = None  # NULL while the provider has not sized the file yet
+    date = None
+    try:
+        date = datetime.datetime.fromtimestamp(int(v["datetaken"]) / 1000)
+    except (ValueError, OSError, OverflowError):
+        try:
+            date = datetime.datetime.fromtimestamp(int(v["date_modified"]))
+        except (ValueError, OSError, OverflowError):
+            date = datetime.datetime.now()
+    mime = v["mime_type"] if v["mime_type"] != "NULL" else ""
+    return {"path": v["_data"], "size": size, "date": date, "mime": mime}
+
+def list_media(adb, folders, kinds=("images", "video")):
+    """Yields every media item under the given device folders, one MediaStore
+    query per kind instead of one stat scan per folder."""
+    prefixes = [f.rstrip("/") + "/" for f in folders]
+    for kind in kinds:
+        args = ["shell", "content", "query", "--uri", MEDIA_URIS[kind],
+                "--projection", ":".join(PROJECTION)]
+        if len(prefixes) == 1:
+            # Let the provider do the filtering when we can express it simply
+            args += ["--where", f"\"_data LIKE '{prefixes[0]}%'\""]
+        for body in iter_rows(adb.stream(args)):
+            item = parse_row(body)
+            if not item: continue
+            if prefixes and not any(item["path"].startswith(p) for p in prefixes): continue
+            yield item
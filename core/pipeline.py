@@ -0,0 +1,113 @@
+import time
+import queue
+import threading
+from .tracing import NULL_TRACER
+
+_DONE = object()
+
+class Stage:
+    """A pool of worker threads fed by a bounded queue.
+
+    handler(item) returns the item for the next stage, or None to drop it.
+    put() blocks while the queue is full, which is what keeps memory flat when
+    a later stage (e.g. a slow NAS) can't keep up. on_close runs once all
+    items went through, for stages that batch (deferred deletes).
+
+    With max_workers, that many threads are started but only `limit` of them
+    take work; set_limit() changes it while running (autotuning)."""
+    def __init__(self, name, handler, workers=1, maxsize=None, on_close=None, logger=None, max_workers=None, tracer=None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers, max_workers or 0)
+        self.limit = max(1, workers)
+        self.limit_cv = threading.Condition()
+        self.closing = False
+        self.inbox = queue.Queue(maxsize or self.workers * 2 + 4)
+        self.on_close = on_close
+        self.logger = logger
+        self.tracer = tracer or NULL_TRACER
+        self.next = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.busy_s = 0.0
+        self.items = 0
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.time()
+        for n in range(self.workers):
+            t = threading.Thread(target=self._loop, args=(n,), name=f"{self.name}-{n}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def put(self, item):
+        self.inbox.put(item)
+
+    def set_limit(self, n):
+        with self.limit_cv:
+            self.limit = max(1, min(n, self.workers))
+            self.limit_cv.notify_all()
+
+    def _loop(self, n):
+        while True:
+            with self.limit_cv:
+                while n >= self.limit and not self.closing:
+                    self.limit_cv.wait()
+                # Parked when the stage closes: the active workers drain the queue
+                if n >= self.limit: return
+            item = self.inbox.get()
+            if item is _DONE: return
+            t0 = time.perf_counter()
+            try:
+                with self.tracer.span(self.name, "stage"):
+                    result = self.handler(item)
+            except Exception as e:
+                result = None
+                if self.logger: self.logger(f"[ERR] {self.name}: {e}")
+            with self.lock:
+                self.busy_s += time.perf_counter() - t0
+                self.items += 1
+            if result is not None and self.next is not None:
+                self.next.put(result)
+
+    def close(self):
+        """Waits for the queue to drain and the workers to exit."""
+        with self.limit_cv:
+            self.closing = True
+            self.limit_cv.notify_all()
+        for _ in self.threads:
+            self.inbox.put(_DONE)
+        for t in self.threads:
+            t.join()
+        if self.on_close:
+            try:
+                self.on_close()
+            except Exception as e:
+                if self.logger: self.logger(f"[ERR] {self.name}: {e}")
+
+    def utilization(self):
+        wall = time.time() - self.started_at if self.started_at else 0
+        if wall <= 0: return 0.0
+        return min(1.0, self.busy_s / (wall * self.limit))
+
+class Pipeline:
+    """Stages chained in order; closing drains them front to back."""
+    def __init__(self, stages):
+        self.stages = stages
+        for a, b in zip(stages, stages[1:]):
+            a.next = b
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def put(self, item):
+        self.stages[0].put(item)
+
+    def close(self):
+        for stage in self.stages:
+            stage.close()
+
+    def report(self):
+        return [f"[PIPE] {s.name}: {s.limit} worker(s), {s.items} items, {s.utilization() * 100:.0f}% busy"
+                for s in self.stages]
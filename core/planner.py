@@ -0,0 +1,92 @@
+import os
+import shutil
+from array import array
+
+# Used for estimates until a real run has been measured
+DEFAULT_BYTES_PER_S = 20 * 1024 * 1024
+DEFAULT_PER_FILE_S = 0.05
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024: return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+def _volume(path):
+    """Device id of the volume a (possibly not yet existing) folder will live on."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path: break
+        path = parent
+    try:
+        return os.stat(path).st_dev, path
+    except OSError:
+        return None, path
+
+def _volumes(dests):
+    """Per source id: the volumes of all its destination folders (a folder or a list)."""
+    return [[_volume(d) for d in ([dest] if isinstance(dest, str) else dest)] for dest in dests]
+
+def check_space(listing, idx, dests, reserve_bytes=0):
+    """Groups queued bytes per destination volume (dests: folder, or list of
+    mirrored folders, per source id; every copy counts).
+    Returns a list of (existing_folder, needed_bytes, free_bytes) for each volume."""
+    needed = {}
+    anchors = {}
+    volumes = _volumes(dests)
+    for i in idx:
+        for dev, anchor in volumes[listing.source_ids[i]]:
+            needed[dev] = needed.get(dev, 0) + max(listing.sizes[i], 0)
+            anchors.setdefault(dev, anchor)
+    result = []
+    for dev, bytes_needed in needed.items():
+        try:
+            free = shutil.disk_usage(anchors[dev]).free - reserve_bytes
+        except OSError:
+            free = None
+        result.append((anchors[dev], bytes_needed, free))
+    return result
+
+def trim_to_fit(listing, idx, dests, reserve_bytes=0):
+    """Keeps files in queue order while every destination volume still has room."""
+    budget = {}
+    volumes = _volumes(dests)
+    for dev, anchor in (v for per_source in volumes for v in per_source):
+        if dev in budget: continue
+        try:
+            budget[dev] = shutil.disk_usage(anchor).free - reserve_bytes
+        except OSError:
+            budget[dev] = float("inf")
+    kept = array("I")
+    for i in idx:
+        size = max(listing.sizes[i], 0)
+        devs = [dev for dev, _ in volumes[listing.source_ids[i]]]
+        if all(size * devs.count(dev) <= budget[dev] for dev in devs):
+            for dev in devs:
+                budget[dev] -= size
+            kept.append(i)
+    return kept
+
+def estimate_seconds(total_bytes, files, bytes_per_s=None, per_file_s=None):
+    bytes_per_s = bytes_per_s or DEFAULT_BYTES_PER_S
+    per_file_s = DEFAULT_PER_FILE_S if per_file_s is None else per_file_s
+    return files * per_file_s + total_bytes / bytes_per_s
+
+def build_plan(listing, idx, labels, skipped, bytes_per_s=None, per_file_s=None):
+    """Summary of what a run would do, without transferring anything."""
+    per_source = {}
+    total = 0
+    for i in idx:
+        label = labels[listing.source_ids[i]]
+        count, size = per_source.get(label, (0, 0))
+        per_source[label] = (count + 1, size + max(listing.sizes[i], 0))
+        total += max(listing.sizes[i], 0)
+    return {
+        "files": len(idx),
+        "bytes": total,
+        "skipped": skipped,
+        "per_source": per_source,
+        "eta_s": estimate_seconds(total, len(idx), bytes_per_s, per_file_s),
+        "measured": bool(bytes_per_s),
+    }
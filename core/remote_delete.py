@@ -0,0 +1,103 @@
+import subprocess
+import threading
+
+# Device-side loop: one record per line on stdin ("<size> <mtime|-> <md5|-> <path>"),
+# one result per line on stdout ("<STATUS> <path>"). The path travels as
+# printf-%b octal escapes, so any file name survives the trip both ways.
+# Results go out with printf: dash's echo would expand the escapes.
+# No single quotes in here: it is passed inside '...' to the device shell.
+DELETE_SCRIPT = r"""
+while read -r size mtime hash enc; do
+  [ "$size" = END ] && break
+  f=$(printf "%bx" "$enc"); f=${f%x}
+  if [ ! -f "$f" ]; then printf "%s %s\n" GONE "$enc"; continue; fi
+  set -- $(stat -c "%s %Y" "$f")
+  if [ "$1" != "$size" ]; then printf "%s %s\n" CHANGED "$enc"; continue; fi
+  if [ "$mtime" != - ] && [ "$2" != "$mtime" ]; then printf "%s %s\n" CHANGED "$enc"; continue; fi
+  if [ "$hash" != - ]; then
+    h=$(md5sum "$f"); h=${h%% *}; h=${h#\\}
+    if [ "$h" != "$hash" ]; then printf "%s %s\n" CHANGED "$enc"; continue; fi
+  fi
+  if rm -f "$f"; then printf "%s %s\n" DELETED "$enc"; else printf "%s %s\n" FAILED "$enc"; fi
+done
+"""
+
+STATUSES = ("DELETED", "CHANGED", "GONE", "FAILED")
+
+_SAFE = frozenset(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._/-+")
+
+def encode_path(path):
+    """Device path (str, surrogates allowed) -> ASCII token with \\0ooo escapes."""
+    raw = path.encode("utf-8", "surrogateescape")
+    return "".join(chr(b) if b in _SAFE else f"\\0{b:03o}" for b in raw)
+
+class DeviceDeleter:
+    """Verify-then-delete on the device in one long-running shell.
+
+    submit() streams a record; the device re-checks size (and mtime / md5 when
+    given) right before the rm, so a file that changed since it was copied is
+    never deleted. on_result(record, status) is called from a reader thread as
+    results stream back. Records without a result (device gone, stopped) were
+    not deleted."""
+    def __init__(self, adb, on_result=None):
+        self.adb = adb
+        self.on_result = on_result
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.proc = None
+        self.reader = None
+        self.results = {status: 0 for status in STATUSES}
+
+    def start(self):
+        try:
+            self.proc = self.adb._spawn(self.adb._cmd(["shell", "sh", "-c", f"'{DELETE_SCRIPT}'"]),
+                                        stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except OSError:
+            self.proc = None
+        if self.proc is None: return False
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+        return True
+
+    def submit(self, path, size, mtime=None, md5=None, tag=None):
+        """Queues one file. tag comes back with its result (defaults to the path)."""
+        if self.proc is None and not self.start(): return False
+        enc = encode_path(path)
+        with self.lock:
+            self.pending.setdefault(enc, []).append(tag if tag is not None else path)
+        line = f"{int(size)} {int(mtime) if mtime else '-'} {md5 or '-'} {enc}\n"
+        try:
+            self.proc.stdin.write(line.encode("ascii"))
+            self.proc.stdin.flush()
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def _read(self):
+        for raw in self.proc.stdout:
+            status, _, enc = raw.decode("ascii", "replace").rstrip("\r\n").partition(" ")
+            if status not in self.results: continue
+            with self.lock:
+                tags = self.pending.get(enc)
+                if not tags: continue
+                tag = tags.pop(0)
+                if not tags: del self.pending[enc]
+            self.results[status] += 1
+            if self.on_result: self.on_result(tag, status)
+
+    def close(self):
+        """Ends the stream and waits for the last results. Returns the tags left without one."""
+        if self.proc is None: return []
+        try:
+            # END also stops the loop on old adb without shell stdin EOF
+            self.proc.stdin.write(b"END - - -\n")
+            self.proc.stdin.close()
+        except (OSError, ValueError):
+            pass
+        self.reader.join()
+        self.proc.wait()
+        self.adb._untrack(self.proc)
+        self.proc = None
+        with self.lock:
+            left, self.pending = [t for tags in self.pending.values() for t in tags], {}
+        return left
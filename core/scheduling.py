@@ -0,0 +1,71 @@
+import os
+from array import array
+
+# Transfer order strategies. Each takes the scan Listing and an index array of
+# the files that passed the filters, and returns the indices in the order they
+# should be pulled. Register new ones with @scheduler.
+SCHEDULERS = {}
+
+VIDEO_EXTS = {".mp4", ".mov", ".3gp", ".mkv", ".webm", ".avi", ".m4v"}
+LARGE_FILE_BYTES = 50 * 1024 * 1024
+SMALL_BATCH = 20
+
+def scheduler(name):
+    def register(fn):
+        SCHEDULERS[name] = fn
+        return fn
+    return register
+
+def is_video(listing, i):
+    mime = listing.mime(i)
+    if mime: return mime.startswith("video/")
+    return os.path.splitext(listing.names[i])[1].lower() in VIDEO_EXTS
+
+@scheduler("Oldest First")
+def oldest_first(listing, idx):
+    return listing.sorted(idx, "mtimes")
+
+@scheduler("Newest First")
+def newest_first(listing, idx):
+    return listing.sorted(idx, "mtimes", reverse=True)
+
+@scheduler("Name (A-Z)")
+def name_asc(listing, idx):
+    return listing.sorted(idx, "names")
+
+@scheduler("Name (Z-A)")
+def name_desc(listing, idx):
+    return listing.sorted(idx, "names", reverse=True)
+
+@scheduler("Smallest First")
+def smallest_first(listing, idx):
+    """Maximizes files secured per minute."""
+    return listing.sorted(idx, "sizes")
+
+@scheduler("Photos First")
+def photos_first(listing, idx):
+    """Two lanes: all photos, then all videos; newest first within each lane."""
+    ordered = newest_first(listing, idx)
+    return (listing.filter(ordered, lambda i: not is_video(listing, i))
+            + listing.filter(ordered, lambda i: is_video(listing, i)))
+
+@scheduler("Interleave by Size")
+def interleave_by_size(listing, idx):
+    """One large file, then a batch of small ones, so a long video never
+    holds back a whole folder of photos (oldest first within each lane)."""
+    ordered = oldest_first(listing, idx)
+    sizes = listing.sizes
+    large = listing.filter(ordered, lambda i: sizes[i] >= LARGE_FILE_BYTES)
+    small = listing.filter(ordered, lambda i: sizes[i] < LARGE_FILE_BYTES)
+    result = array("I")
+    li = si = 0
+    while li < len(large) or si < len(small):
+        if li < len(large):
+            result.append(large[li])
+            li += 1
+        result.extend(small[si:si + SMALL_BATCH])
+        si += SMALL_BATCH
+    return result
+
+def schedule(listing, idx, order):
+    return SCHEDULERS.get(order, oldest_first)(listing, idx)
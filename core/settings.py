@@ -8,10 +8,61 @@ DEFAULTS = {
     "adb_path": "",
     "remote_path": DEFAULT_REMOTE_PATH,
     "last_dest": "",
+    # Extra backup roots: every file is pulled once and copied to each of them
+    # (same layout as last_dest); delete-after waits for all copies
+    "mirror_dests": [],
+    # Extra remote folders: [{"remote_path", "dest", "label", "filter_*" overrides}]
+    # Empty = just remote_path -> last_dest
+    "sources": [],
     "limit_n": 0,
     "debug_mode": False,
+    # Write a Chrome trace (chrome://tracing / Perfetto) of each run to logs/
+    "trace": False,
+    # Files at or above this size use the resumable chunked pull (0 = never)
+    "chunked_threshold_mb": 1024,
+    "chunk_mb": 16,
+    "chunk_hash": False,
+    # Sync pipeline: parallel adb pulls / local placement (sort, move) workers
+    "transfer_workers": 1,
+    # Hill-climb the parallel pull count on measured bytes/s (up to the max);
+    # speeds are remembered per device + transport in osk_throughput.json
+    "autotune": True,
+    "transfer_workers_max": 4,
+    "place_workers": 2,
+    # Post-copy check (size always; md5 vs device when verify_hash is on)
+    "verify_workers": 2,
+    "verify_hash": False,
+    # Write-behind: pull to this local folder first, flush to last_dest in the
+    # background (for slow network shares). Empty = pull straight into place
+    "scratch_dir": "",
+    "scratch_limit_mb": 4096,
+    # Watch mode: sync by itself when one of these serials connects with new
+    # files (empty = any authorized device); state kept in osk_watch.json
+    "watch_mode": False,
+    "watch_serials": [],
+    # Live session: after the queue, keep watching the folders (inotifyd, or a
+    # device-side listing diff every live_poll_s) and pull new files until STOP
+    "live_feed": False,
+    "live_poll_s": 2,
+    # How long a run waits for a dropped device to come back
+    "reconnect_timeout_s": 60,
+    # Disk-space preflight: "abort" the run or "trim" the queue to fit
+    "space_policy": "abort",
+    "space_reserve_mb": 512,
+    # Last measured transfer speed (bytes/s), used for plan estimates
+    "measured_bps": 0,
     "smart_sort": True,
+    # "files" = YYYY-MM folders; "archive" = append to YYYY-MM.tar (+ .tar.idx index)
+    "output_mode": "files",
+    # "mtime" buckets by file timestamp; "capture" reads EXIF/QuickTime dates
+    "date_source": "mtime",
     "sort_order": "Oldest First",
+    # "adb" = phone; "local" = remote_path is a folder on this PC (card reader,
+    # mounted camera), listed with scandir and copied kernel-side
+    "source_backend": "adb",
+    # "stat" scans remote_path; "mediastore" queries the media provider
+    "listing_backend": "stat",
+    "media_folders": "",
     # --- Phase 2: Filters ---
     "filter_enable_date": False,
     "filter_date_start": "2020-01-01",
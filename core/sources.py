@@ -0,0 +1,272 @@
+import os
+import errno
+import shutil
+import threading
+from .adb import AdbWrapper, decode_name, shell_quote
+from .chunked import pull_chunked
+from .mediastore import list_media
+from .remote_delete import DeviceDeleter, STATUSES
+from .change_feed import ChangeFeed
+from .capture_date import DateCache
+from .tracing import NULL_TRACER
+from .hashing import file_md5
+
+# Bytes per kernel copy call, so a local copy notices Stop between calls
+COPY_CHUNK = 8 * 1024 * 1024
+
+def make_source(config, logger=None, tracer=None):
+    """The backend a run reads from: 'adb' (phone) or 'local' (card reader, mounted storage)."""
+    if config.get("source_backend", "adb") == "local":
+        return LocalSource(config, logger, tracer)
+    return AdbSource(config, logger, tracer)
+
+class AdbSource:
+    """A phone over adb: listings via find/stat (or the MediaStore), pulls,
+    hashes and deletes all run through the device."""
+    kind = "adb"
+
+    def __init__(self, config, logger=None, tracer=None):
+        self.config = config
+        self.tracer = tracer or NULL_TRACER
+        self.adb = AdbWrapper(config["adb_path"], config.get("debug_mode", False), logger, self.tracer)
+        self.logger = logger
+
+    @property
+    def serial(self):
+        return self.adb.serial
+
+    def connect(self, serial=None):
+        """Pins the device, so a reconnect can't silently continue on another phone. Returns the transport."""
+        self.adb.serial = serial or self.adb.get_serial()
+        return self.adb.get_transport()
+
+    def iter_files(self, folder, errors=None):
+        """Yields (name, mtime or None, size) of the regular files in one folder."""
+        stream = self.adb.list_dir_records(folder)
+        count = 0
+        for mtime, size, name in stream:
+            try:
+                mtime = int(float(mtime))
+                size = int(size)
+            except ValueError:
+                continue
+            count += 1
+            yield decode_name(name), mtime, size
+        if count or stream.returncode == 0 or self.adb.cancelled.is_set(): return
+
+        # Text fallback for old toolboxes without find -printf
+        stream = self.adb.stream(["shell", "cd", shell_quote(folder), "&&", "stat", "-c", "'%Y|%s|%n'", "*"])
+        for line in stream:
+            parts = line.strip().split("|", 2)
+            if len(parts) != 3: continue
+            ts_str, size_str, name = parts
+            # A line without a size is not a usable record
+            if not size_str.isdigit(): continue
+            yield name, int(ts_str) if ts_str.isdigit() else None, int(size_str)
+        if stream.returncode != 0 and errors is not None:
+            errors.append(f"{folder}: stat failed (exit {stream.returncode})")
+
+    def list_media(self, folders):
+        """MediaStore listing; adb only (the worker checks kind before calling)."""
+        return list_media(self.adb, folders)
+
+    def capture_date(self, resolver, path, size, mtime):
+        return resolver.resolve_remote(self.adb, path, size, mtime)
+
+    def date_key(self, path, size, mtime):
+        """Date cache key of a file on the device (shared with capture_date)."""
+        return DateCache.key("adb:" + path, size, mtime or 0)
+
+    def pull(self, path, local_path, size, mtime, stop_event=None, logger=None):
+        """Copies one file to local_path via '<local>.part'. Big files go through
+        the resumable chunked path."""
+        threshold = self.config.get("chunked_threshold_mb", 1024) * 1024 * 1024
+        if threshold > 0 and size >= threshold:
+            return pull_chunked(
+                self.adb, path, local_path, size, mtime,
+                chunk_bytes=self.config.get("chunk_mb", 16) * 1024 * 1024,
+                hash_chunks=self.config.get("chunk_hash", False),
+                stop_event=stop_event, logger=logger)
+
+        part = local_path + ".part"
+        pull_res = self.adb.run(["pull", "-a", path, part])
+        if pull_res.returncode != 0:
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+            return False
+        with self.tracer.span("rename part", "fs"):
+            os.replace(part, local_path)
+        return True
+
+    def md5(self, path):
+        res = self.adb.run(["shell", "md5sum", shell_quote(path)])
+        if res.returncode != 0: return None
+        # GNU-style md5sum prefixes the line with a backslash when the name needs escaping
+        return res.stdout.split(" ", 1)[0].strip().lstrip("\\") or None
+
+    def deleter(self, on_result=None):
+        return DeviceDeleter(self.adb, on_result)
+
+    def change_feed(self, folders, on_file, known=(), interval=2, stop_event=None, logger=None):
+        return ChangeFeed(self.config["adb_path"], self.adb.serial, folders, on_file, known, interval, stop_event, logger, self.tracer)
+
+    def is_online(self):
+        return self.adb.is_online()
+
+    def after_delete(self):
+        with self.tracer.span("media scan"):
+            self.adb.scan_media()
+
+    def cancel(self):
+        self.adb.cancel()
+
+    def reset_cancel(self):
+        self.adb.reset_cancel()
+
+def copy_file(src, dst, stop_event=None):
+    """Copies src to dst inside the kernel: copy_file_range (reflinks / server
+    side copies where the file system can), else sendfile, else a plain
+    buffered copy (Windows). Returns False if stopped part way."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(infd).st_size
+        offset = 0
+        for call in ("copy_file_range", "sendfile"):
+            if offset >= size or not hasattr(os, call): continue
+            try:
+                while offset < size:
+                    if stop_event is not None and stop_event.is_set(): return False
+                    count = min(COPY_CHUNK, size - offset)
+                    if call == "copy_file_range":
+                        n = os.copy_file_range(infd, outfd, count, offset, offset)
+                    else:
+                        os.lseek(outfd, offset, os.SEEK_SET)
+                        n = os.sendfile(outfd, infd, offset, count)
+                    if n == 0: break
+                    offset += n
+            except OSError as e:
+                # Not supported here (cross-device on old kernels, FUSE, ...): next method
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTSOCK):
+                    raise
+        if offset < size:
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            while True:
+                if stop_event is not None and stop_event.is_set(): return False
+                block = fsrc.read(COPY_CHUNK)
+                if not block: break
+                fdst.write(block)
+    return True
+
+class LocalDeleter:
+    """DeviceDeleter for local sources: the same size/mtime/md5 re-check, run in place."""
+    def __init__(self, on_result=None):
+        self.on_result = on_result
+        self.results = {status: 0 for status in STATUSES}
+
+    def submit(self, path, size, mtime=None, md5=None, tag=None):
+        status = self._delete(path, size, mtime, md5)
+        self.results[status] += 1
+        if self.on_result: self.on_result(tag if tag is not None else path, status)
+        return True
+
+    def _delete(self, path, size, mtime, md5):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return "GONE"
+        if st.st_size != int(size) or (mtime and int(st.st_mtime) != int(mtime)): return "CHANGED"
+        if md5 and LocalSource.md5(path) != md5: return "CHANGED"
+        try:
+            os.remove(path)
+        except OSError:
+            return "FAILED"
+        return "DELETED"
+
+    def close(self):
+        return []
+
+class LocalSource:
+    """A folder on this machine (SD card reader, mounted camera storage).
+    Listings come from os.scandir, copies stay inside the kernel (copy_file)."""
+    kind = "local"
+
+    def __init__(self, config, logger=None, tracer=None):
+        self.config = config
+        self.logger = logger
+        self.tracer = tracer or NULL_TRACER
+        self.root = config["remote_path"].rstrip("/\\") or config["remote_path"]
+        self.cancelled = threading.Event()
+
+    @property
+    def serial(self):
+        return f"local:{self.root}"
+
+    def connect(self, serial=None):
+        return "local"
+
+    def iter_files(self, folder, errors=None):
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_file(): continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.name, int(st.st_mtime), st.st_size
+        except OSError as e:
+            if errors is not None: errors.append(f"{folder}: {e.strerror or e}")
+
+    def capture_date(self, resolver, path, size, mtime):
+        # Headers are read straight from the card
+        return resolver.resolve(path)
+
+    def date_key(self, path, size, mtime):
+        return DateCache.key(path, size, mtime or 0)
+
+    def pull(self, path, local_path, size, mtime, stop_event=None, logger=None):
+        part = local_path + ".part"
+        try:
+            with self.tracer.span("copy_file", "fs", size=size):
+                ok = copy_file(path, part, stop_event or self.cancelled)
+            if ok:
+                # Keep the timestamps, like 'adb pull -a'
+                shutil.copystat(path, part)
+                os.replace(part, local_path)
+                return True
+        except OSError as e:
+            if logger: logger(f"[ERR] {os.path.basename(path)}: {e}")
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        return False
+
+    @staticmethod
+    def md5(path):
+        try:
+            return file_md5(path)
+        except OSError:
+            return None
+
+    def deleter(self, on_result=None):
+        return LocalDeleter(on_result)
+
+    def change_feed(self, folders, on_file, known=(), interval=2, stop_event=None, logger=None):
+        return None
+
+    def is_online(self):
+        # A pulled card reader takes its mount point with it
+        return os.path.isdir(self.root)
+
+    def after_delete(self):
+        pass
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def reset_cancel(self):
+        self.cancelled.clear()
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import threading
+
+MODEL_FILE = "osk_throughput.json"
+# Weight of the newest run when blending with what was measured before
+ALPHA = 0.5
+
+def fit_pulls(samples):
+    """Least-squares fit of pull time = overhead + size / rate over (size, seconds)
+    samples. Returns (overhead_s, bytes_per_s), or None without enough spread."""
+    n = len(samples)
+    if n < 3: return None
+    mean_x = sum(s for s, _ in samples) / n
+    mean_y = sum(t for _, t in samples) / n
+    var = sum((s - mean_x) ** 2 for s, _ in samples)
+    if var <= 0: return None
+    slope = sum((s - mean_x) * (t - mean_y) for s, t in samples) / var
+    if slope <= 0: return None
+    return max(0.0, mean_y - slope * mean_x), 1.0 / slope
+
+class ThroughputModel:
+    """Measured transfer speed per device serial + transport, persisted between runs.
+
+    Per link: single-pull overhead and rate (fitted from per-file pull times),
+    the parallel speed-up the run achieved and the best transfer worker count."""
+    def __init__(self, model_file=MODEL_FILE):
+        self.model_file = model_file
+        self.data = {}
+        try:
+            if os.path.exists(model_file):
+                with open(model_file, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+        except Exception:
+            self.data = {}
+
+    @staticmethod
+    def key(serial, transport):
+        return f"{serial or 'unknown'}|{transport}"
+
+    def get(self, serial, transport):
+        return self.data.get(self.key(serial, transport))
+
+    def estimate(self, serial, transport):
+        """(bytes_per_s, per_file_s) for the planner, or None if this link was never measured."""
+        rec = self.get(serial, transport)
+        if not rec: return None
+        speedup = max(1.0, rec.get("speedup", 1.0))
+        return rec["bps"] * speedup, rec["overhead_s"] / speedup
+
+    def update(self, serial, transport, samples, wall_s, workers):
+        """Blends one run's pull samples into the model. Returns the new record or None."""
+        fit = fit_pulls(samples)
+        total_bytes = sum(s for s, _ in samples)
+        busy_s = sum(t for _, t in samples)
+        if wall_s <= 0 or busy_s <= 0 or total_bytes <= 0: return None
+        if fit is None:
+            # All files the same size: treat the whole time as transfer time
+            fit = (0.0, total_bytes / busy_s)
+        overhead, bps = fit
+        speedup = max(1.0, busy_s / wall_s)
+        key = self.key(serial, transport)
+        old = self.data.get(key)
+        if old:
+            overhead = ALPHA * overhead + (1 - ALPHA) * old["overhead_s"]
+            bps = ALPHA * bps + (1 - ALPHA) * old["bps"]
+            speedup = ALPHA * speedup + (1 - ALPHA) * old.get("speedup", 1.0)
+        rec = {"overhead_s": round(overhead, 4), "bps": int(bps), "speedup": round(speedup, 2),
+               "workers": workers, "runs": (old or {}).get("runs", 0) + 1, "updated": int(time.time())}
+        self.data[key] = rec
+        return rec
+
+    def save(self):
+        try:
+            with open(self.model_file, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=1)
+        except Exception:
+            pass
+
+class Autotuner(threading.Thread):
+    """Hill-climbs the number of parallel pulls on measured bytes/s.
+
+    Every window it steps the worker count and compares throughput with the
+    previous window. A step that made things worse is undone, the count is
+    held for a few windows and then probed in the other direction. Windows
+    where nothing moved (link down, big file still in flight) are skipped."""
+    HOLD_WINDOWS = 3
+
+    def __init__(self, stage, read_bytes, low=1, high=4, window_s=5.0, stop_event=None, logger=None):
+        super().__init__(daemon=True)
+        self.stage = stage
+        self.read_bytes = read_bytes
+        self.low = low
+        self.high = high
+        self.window_s = window_s
+        self.stop_event = stop_event or threading.Event()
+        self.logger = logger
+        self.done = threading.Event()
+        self.best = (0.0, stage.limit)
+
+    def _clamp(self, n):
+        return min(self.high, max(self.low, n))
+
+    def run(self):
+        step = 1
+        hold = 0
+        last_rate = None
+        prev_workers = None
+        last_bytes = self.read_bytes()
+        last_t = time.perf_counter()
+        while not self.done.wait(self.window_s) and not self.stop_event.is_set():
+            now_bytes, now_t = self.read_bytes(), time.perf_counter()
+            rate = (now_bytes - last_bytes) / (now_t - last_t)
+            last_bytes, last_t = now_bytes, now_t
+            if rate <= 0: continue
+            workers = self.stage.limit
+            if rate > self.best[0]: self.best = (rate, workers)
+            if hold:
+                hold -= 1
+                last_rate = rate
+                prev_workers = None
+                continue
+            if last_rate is not None and prev_workers is not None and rate < last_rate * 0.95:
+                # The last step hurt: go back, stay a while, then try the other way
+                target = prev_workers
+                step = -step
+                hold = self.HOLD_WINDOWS
+            else:
+                target = self._clamp(workers + step)
+                if target == workers:
+                    step = -step
+                    target = self._clamp(workers + step)
+            last_rate = rate
+            prev_workers = workers
+            if target != workers:
+                self.stage.set_limit(target)
+                if self.logger: self.logger(f"[TUNE] {rate / 1024 / 1024:.1f} MB/s with {workers} pull(s), trying {target}")
+
+    def stop(self):
+        self.done.set()
@@ -0,0 +1,22 @@
+import time
+import threading
+
+class StartupTimer:
+    """Records named startup milestones relative to process start."""
+    def __init__(self, t0=None):
+        self.t0 = t0 if t0 is not None else time.perf_counter()
+        self.marks = []
+        self.lock = threading.Lock()
+
+    def mark(self, name):
+        with self.lock:
+            if any(n == name for n, _ in self.marks): return
+            self.marks.append((name, time.perf_counter() - self.t0))
+
+    def has(self, name):
+        with self.lock:
+            return any(n == name for n, _ in self.marks)
+
+    def report(self):
+        with self.lock:
+            return [f"[DEBUG] STARTUP {name}: {sec * 1000:.0f} ms" for name, sec in self.marks]
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import threading
+
+class _Span:
+    """Times one block; extra args (bytes, exit code...) can be set while it runs."""
+    __slots__ = ("tracer", "name", "cat", "args", "t0")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        t1 = time.perf_counter()
+        if exc_type is not None: self.args["error"] = exc_type.__name__
+        self.tracer._add({
+            "name": self.name, "cat": self.cat, "ph": "X",
+            "ts": (self.t0 - self.tracer.t0) * 1e6, "dur": (t1 - self.t0) * 1e6,
+            "pid": self.tracer.pid, "args": self.args,
+        })
+        return False
+
+class _NoSpan:
+    """Shared stand-in while tracing is off, so call sites cost next to nothing."""
+    def set(self, **args): pass
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc, tb): return False
+
+_NO_SPAN = _NoSpan()
+
+class Tracer:
+    """Collects spans of one session and writes them as a Chrome trace
+    (open in chrome://tracing or ui.perfetto.dev)."""
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.threads = {}
+        self.lock = threading.Lock()
+        self.t0 = time.perf_counter()
+        self.pid = os.getpid()
+
+    def start(self):
+        with self.lock:
+            self.events = []
+            self.threads = {}
+            self.t0 = time.perf_counter()
+            self.enabled = True
+
+    def span(self, name, cat="worker", /, **args):
+        if not self.enabled: return _NO_SPAN
+        return _Span(self, name, cat, args)
+
+    def instant(self, name, cat="worker", /, **args):
+        if not self.enabled: return
+        self._add({"name": name, "cat": cat, "ph": "i", "s": "t",
+                   "ts": (time.perf_counter() - self.t0) * 1e6,
+                   "pid": self.pid, "args": args})
+
+    def _add(self, event):
+        # OS thread ids get reused by short-lived threads; name + id keeps lanes apart
+        thread = threading.current_thread()
+        key = (thread.ident, thread.name)
+        with self.lock:
+            tid = self.threads.get(key)
+            if tid is None:
+                tid = self.threads[key] = len(self.threads) + 1
+            event["tid"] = tid
+            self.events.append(event)
+
+    def stop(self, path):
+        """Ends the session and writes the trace file. Returns the span count."""
+        with self.lock:
+            self.enabled = False
+            events, threads = self.events, self.threads
+            self.events, self.threads = [], {}
+        meta = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                for (_, name), tid in threads.items()]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms"}, f,
+                      ensure_ascii=True, default=str)
+        return len(events)
+
+# Never started: the default of components not handed a session. Each worker
+# owns its Tracer, so a Sync and a Verify traced together stay apart.
+NULL_TRACER = Tracer()
@@ -0,0 +1,173 @@
+import os
+import json
+import threading
+import subprocess
+from .adb import AdbWrapper, shell_quote
+from .sources import AdbSource
+from .manifest import Manifest
+from .events import Log, DeviceState, WatchTrigger
+
+WATCH_FILE = "osk_watch.json"
+
+def parse_devices(payload):
+    """'serial<TAB>state' lines of one track-devices message -> {serial: state}."""
+    devices = {}
+    for line in payload.splitlines():
+        parts = line.split("\t")
+        if len(parts) >= 2 and parts[0]: devices[parts[0]] = parts[1].strip()
+    return devices
+
+def watched_folders(config):
+    """Remote folders a sync of this config would list."""
+    folders = [s["remote_path"].rstrip("/") for s in config.get("sources", [])
+               if s.get("enabled", True) and s.get("remote_path")]
+    if folders: return folders
+    folders = [config["remote_path"].rstrip("/")]
+    if config.get("listing_backend", "stat") == "mediastore":
+        folders += [f.strip().rstrip("/") for f in config.get("media_folders", "").split(";") if f.strip()]
+    return folders
+
+def folder_signatures(adb, folders):
+    """{folder: "mtime count"} of each remote folder, in one shell call. A folder
+    gains a new mtime or entry count whenever a file is added, removed or renamed."""
+    script = "; ".join(f"echo $(stat -c %Y {shell_quote(f)} 2>/dev/null || echo -) $(ls -A {shell_quote(f)} 2>/dev/null | wc -l)"
+                       for f in folders)
+    res = adb.run(["shell", script])
+    if res.returncode != 0: return None
+    lines = [line.strip() for line in res.stdout.splitlines() if line.strip()]
+    if len(lines) != len(folders): return None
+    return dict(zip(folders, lines))
+
+class WatchState:
+    """Last synced folder signatures per device serial (osk_watch.json)."""
+    def __init__(self, state_file=WATCH_FILE):
+        self.state_file = state_file
+        self.lock = threading.Lock()
+        self.data = {}
+        try:
+            if os.path.exists(state_file):
+                with open(state_file, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+        except Exception:
+            self.data = {}
+
+    def get(self, serial):
+        with self.lock:
+            return dict(self.data.get(serial, {}))
+
+    def update(self, serial, signatures):
+        with self.lock:
+            self.data.setdefault(serial, {}).update(signatures)
+            try:
+                with open(self.state_file, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f, indent=1)
+            except Exception:
+                pass
+
+class DeviceWatcher(threading.Thread):
+    """Watch mode: follows 'adb track-devices' and asks for a sync when a known
+    device connects with new media.
+
+    The adb server pushes every device change down that one connection, so
+    the thread sits in a blocking read (no polling) while nothing happens.
+    On connect the check gets cheaper the less changed: folder mtime + entry
+    count first; only changed folders are listed and compared with the
+    manifests. WatchTrigger is published only if new files exist."""
+    def __init__(self, config, bus):
+        super().__init__(daemon=True)
+        self.config = config
+        self.bus = bus
+        self.adb = AdbWrapper(config["adb_path"])
+        self.state = WatchState()
+        self.stop_event = threading.Event()
+        self.devices = {}
+
+    def _log(self, msg):
+        self.bus.publish(Log(msg))
+
+    def stop(self):
+        self.stop_event.set()
+        self.adb.cancel()
+
+    def run(self):
+        delay = 1
+        while not self.stop_event.is_set():
+            try:
+                proc = self.adb._spawn(self.adb._cmd(["track-devices"]), stderr=subprocess.DEVNULL)
+            except OSError:
+                proc = None
+            if proc is not None:
+                try:
+                    self._follow(proc)
+                    delay = 1
+                finally:
+                    proc.kill()
+                    proc.wait()
+                    self.adb._untrack(proc)
+            # adb server restarted or missing: reconnect, backing off
+            if self.stop_event.wait(delay): break
+            delay = min(delay * 2, 30)
+
+    def _follow(self, proc):
+        while not self.stop_event.is_set():
+            # Each message: 4 hex digits of length, then the full device list
+            head = proc.stdout.read(4)
+            if len(head) < 4: return
+            try:
+                n = int(head, 16)
+            except ValueError:
+                return
+            payload = proc.stdout.read(n).decode("utf-8", "replace") if n else ""
+            devices = parse_devices(payload)
+            for serial in set(self.devices) | set(devices):
+                state = devices.get(serial, "gone")
+                if self.devices.get(serial, "gone") == state: continue
+                self.bus.publish(DeviceState(serial, state))
+                if state == "device" and self._known(serial):
+                    self._check(serial)
+            self.devices = devices
+
+    def _known(self, serial):
+        serials = self.config.get("watch_serials", [])
+        return not serials or serial in serials
+
+    def _check(self, serial):
+        source = AdbSource(self.config)
+        source.adb.serial = serial
+        folders = watched_folders(self.config)
+        signatures = folder_signatures(source.adb, folders)
+        if signatures is None:
+            self._log(f"[WATCH] {serial}: folders not readable yet, skipped.")
+            return
+        last = self.state.get(serial)
+        changed = [f for f in folders if last.get(f) != signatures[f]]
+        if not changed:
+            self._log(f"[WATCH] {serial} connected, nothing changed.")
+            return
+
+        # Listing delta of the changed folders against what is already backed up
+        dest = self.config.get("last_dest", "")
+        manifests = [Manifest(root) for root in [dest] + self.config.get("mirror_dests", []) if root]
+        new_files = 0
+        errors = []
+        for folder in changed:
+            # Same listing as a sync (stat fallback for old toolboxes)
+            for name, _, size in source.iter_files(folder, errors):
+                if name.startswith("."): continue
+                if not all(m.has(f"{folder}/{name}", size) for m in manifests):
+                    new_files += 1
+        if not new_files and errors:
+            # An unreadable folder is not an unchanged one: keep the old state, check again next time
+            self._log(f"[WATCH] {serial}: listing failed ({'; '.join(errors)}), skipped.")
+            return
+        if not new_files:
+            # Deletes / renames only: remember the new state, nothing to pull
+            self._log(f"[WATCH] {serial} connected, no new files.")
+            self.state.update(serial, signatures)
+            return
+        self._log(f"[WATCH] {serial} connected: {new_files} new file(s) in {len(changed)} folder(s).")
+        self.bus.publish(WatchTrigger(serial, new_files, signatures))
+
+    def commit(self, serial, signatures):
+        """Called after the triggered sync finished: the folders are now backed up."""
+        self.state.update(serial, signatures)
@@ -1,10 +1,28 @@
 import threading
+import queue
 import os
 import time
 import datetime
 import shutil
-from .adb import AdbWrapper
-from .sorting import parse_timestamp, should_process
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from .sorting import filter_indices
+from .listing import Listing
+from .matcher import FingerprintMatcher
+from .capture_date import CaptureDateResolver
+from .scheduling import schedule
+from .manifest import Manifest
+from .archive import ArchiveSet, INDEX_SUFFIX
+from .hashing import md5_hex, read_blocks
+from .sources import make_source
+from .pipeline import Stage, Pipeline
+from .planner import check_space, trim_to_fit, build_plan, format_bytes, estimate_seconds
+from .throughput import ThroughputModel, Autotuner
+from .tracing import Tracer
+from .events import Log, Status, Progress, WiggleStart, WiggleStop, Jump, Error, Done, PlanDone, Throughput, VerifyDone
+
+# Times one file is retried after the device came back from a dropout
+MAX_RETRIES = 3
 
 def format_time(seconds):
     if seconds < 60: return f"{int(seconds)}s"
@@ -12,223 +30,1053 @@ def format_time(seconds):
     secs = int(seconds % 60)
     return f"{mins}m {secs}s"
 
+def reserve_name(path):
+    """Creates path empty if it does not exist yet (O_EXCL, so two workers can
+    never both get it). Returns False if the name is taken."""
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+def reserve_free_name(path):
+    """Reserves the first free '<base>_<n><ext>' next to path."""
+    base, ext = os.path.splitext(path)
+    n = 1
+    while not reserve_name(f"{base}_{n}{ext}"):
+        n += 1
+    return f"{base}_{n}{ext}"
+
+def save_trace(tracer, kind, log):
+    """Ends a worker's tracing session and writes logs/trace_<kind>_<time>.json."""
+    ts = datetime.datetime.now().strftime("%Y-%m-%d_%H%M%S")
+    path = os.path.join("logs", f"trace_{kind}_{ts}.json")
+    try:
+        count = tracer.stop(path)
+        log(f"[TRACE] {count} spans written to {path}")
+    except OSError as e:
+        log(f"[ERR] Trace: {e}")
+
 class SyncWorker(threading.Thread):
-    def __init__(self, config, ui_queue):
+    def __init__(self, config, bus):
         super().__init__(daemon=True)
         self.config = config
-        self.queue = ui_queue
+        self.bus = bus
         self.stop_event = threading.Event()
+        # Own trace session: a Verify traced at the same time writes its own file
+        self.tracer = Tracer()
         
         # Setup Logger adapter
-        def log_adapter(msg): self.queue.put(("log", msg))
-        self.adb = AdbWrapper(config["adb_path"], config["debug_mode"], log_adapter)
-        
+        def log_adapter(msg): self.bus.publish(Log(msg))
+        self.source = make_source(config, log_adapter, self.tracer)
+
     def _log(self, msg):
-        self.queue.put(("log", msg))
+        self.bus.publish(Log(msg))
+
+    def _sources(self):
+        """Remote folders to sync. Each source may override filters and map to its own
+        destination; without a 'sources' list it is just remote_path -> last_dest."""
+        base_dest = self.config["last_dest"]
+        self.mirror_roots = [d for d in self.config.get("mirror_dests", []) if d]
+        raw = [s for s in self.config.get("sources", []) if s.get("enabled", True) and s.get("remote_path")]
+        if not raw:
+            raw = [{"remote_path": self.config["remote_path"]}]
+
+        sources = []
+        labels = set()
+        for src in raw:
+            cfg = dict(self.config)
+            cfg.update(src)
+            cfg["remote_path"] = src["remote_path"].rstrip("/")
+            dest = src.get("dest", "")
+            cfg["dest"] = dest if os.path.isabs(dest) else os.path.join(base_dest, dest) if dest else base_dest
+            label = src.get("label") or cfg["remote_path"].rsplit("/", 1)[-1] or cfg["remote_path"]
+            # Stats and mirror folders are keyed by label: DCIM/Screenshots and
+            # Pictures/Screenshots must not share one
+            cfg["label"], n = label, 2
+            while cfg["label"] in labels:
+                cfg["label"] = f"{label} ({n})"
+                n += 1
+            labels.add(cfg["label"])
+            # Same layout under every mirror root; absolute dests go to a per-label folder
+            cfg["mirrors"] = [os.path.join(root, dest) if dest and not os.path.isabs(dest)
+                              else os.path.join(root, cfg["label"]) if dest else root
+                              for root in self.mirror_roots]
+            sources.append(cfg)
+        return sources
+
+    def _scan_folder(self, remote_dir, source_id=0):
+        """Lists one folder through the source backend. Returns None if it can't be read."""
+        errors = []
+        listing = Listing()
+        for name, mtime, size in self.source.iter_files(remote_dir, errors):
+            # Ignore hidden/thumbs
+            if name.startswith("."): continue
+            listing.append(name, remote_dir, mtime if mtime is not None else int(time.time()), size, source_id)
+        if errors:
+            self.scan_errors.extend(errors)
+            if not len(listing): return None
+        return listing
+
+    def _scan_mediastore(self, remote_dir, folders=None, source_id=0):
+        # One provider query covers every folder, and gives capture dates (DATE_TAKEN)
+        if not folders: folders = [remote_dir]
+        self._log(f"[SCAN] MediaStore query: {', '.join(folders)}")
+
+        listing = Listing()
+        for entry in self.source.list_media(folders):
+            if entry["path"].rsplit("/", 1)[-1].startswith("."): continue
+            listing.append_path(entry["path"], entry["date"].timestamp(), entry["size"], source_id, entry["mime"])
+        return listing
+
+    def _scan_source(self, source_id):
+        """Lists and filters one source. Returns (listing, accepted indices), or None if the scan failed."""
+        src = self.sources[source_id]
+        with self.tracer.span("scan source", label=src["label"]) as span:
+            result = self._scan_source_inner(src, source_id)
+            if result: span.set(files=len(result[0]), accepted=len(result[1]))
+        return result
+
+    def _scan_source_inner(self, src, source_id):
+        remote_dir = src["remote_path"]
+        mediastore = src.get("listing_backend", "stat") == "mediastore" and self.source.kind == "adb"
+        if mediastore:
+            folders = None
+            if not self.config.get("sources"):
+                folders = [f.strip() for f in src.get("media_folders", "").split(";") if f.strip()]
+            listing = self._scan_mediastore(remote_dir, folders, source_id)
+        else:
+            listing = self._scan_folder(remote_dir, source_id)
+        if listing is None: return None
+
+        # Capture dates for the date filter have to come from the device (partial head read)
+        if src.get("date_source", "mtime") == "capture" and src.get("filter_enable_date", False) and not mediastore:
+            resolver = self.resolver
+            dates = list(resolver.pool.map(
+                lambda i: self.source.capture_date(resolver, listing.path(i), listing.sizes[i], listing.mtimes[i]),
+                range(len(listing))))
+            found = {}
+            for i, date in enumerate(dates):
+                if date:
+                    # mtimes now hold the capture date (filter / sort); placement
+                    # takes it from capture_dates, as the cache key needs the device mtime
+                    found[listing.path(i)] = date
+                    listing.mtimes[i] = int(date.timestamp())
+            self.capture_dates.update(found)
+
+        # Apply Filters (Phase 2)
+        idx, ignored_count = filter_indices(listing, listing.indices(), src)
+        if ignored_count > 0:
+            self._log(f"(!) Filter Active [{src['label']}]: Ignored {ignored_count} files.")
+        return listing, idx
+
+    def _item(self, i):
+        """Materializes one queued row for the transfer loop."""
+        listing = self.listing
+        src = self.sources[listing.source_ids[i]]
+        item = {
+            "name": listing.names[i],
+            "path": listing.path(i),
+            "size": listing.size(i),
+            "mtime": listing.mtimes[i],
+            "date": listing.date(i),
+            "mime": listing.mime(i),
+            "source": src["label"],
+            "dest": src["dest"],
+            "mirrors": src["mirrors"],
+        }
+        # Only a plain stat mtime can be re-checked on the device before delete
+        if ((src.get("listing_backend", "stat") == "stat" or self.source.kind != "adb")
+                and not (src.get("date_source", "mtime") == "capture" and src.get("filter_enable_date", False))):
+            item["remote_mtime"] = listing.mtimes[i]
+        return item
 
     def run(self):
+        trace = self.config.get("trace", False)
+        if trace: self.tracer.start()
+        # One date cache per run, shared by the scans and the placement workers
+        # (separate caches would each save the file and drop the others' entries)
+        self.resolver = None
+        self.capture_dates = {}
+        if any(src.get("date_source", self.config.get("date_source", "mtime")) == "capture"
+               for src in [self.config] + self.config.get("sources", [])):
+            self.resolver = CaptureDateResolver()
+        try:
+            with self.tracer.span("sync run"):
+                self._run()
+        finally:
+            if self.resolver: self.resolver.close()
+            if trace: save_trace(self.tracer, "sync", self._log)
+
+    def _run(self):
         self._log(f"--- Starting Extraction (Filter Aware) ---")
-        self.queue.put(("wiggle_start",))
-        self.queue.put(("status", "Scanning files & attributes..."))
+        self.bus.publish(WiggleStart())
+        self.bus.publish(Status("Scanning files & attributes..."))
 
-        # We need STAT for dates now, ls is not enough for filters
-        # cmd: stat -c '%Y|%n' *
-        remote_dir = self.config["remote_path"].rstrip("/")
-        res = self.adb.run(["shell", "cd", f"'{remote_dir}'", "&&", "stat", "-c", "'%Y|%n'", "*"])
+        # Pin the device, so a reconnect can't silently continue on another phone
+        self.transport = self.source.connect(self.config.get("serial"))
+        self.model = ThroughputModel()
 
-        if res.returncode != 0:
-            self.queue.put(("error", f"Scan failed (stat required):\n{res.stderr}"))
-            self.queue.put(("wiggle_stop",))
-            return
+        # Scan every source at once; the device handles several shells fine
+        self.scan_errors = []
+        self.sources = self._sources()
+        with self.tracer.span("scan", sources=len(self.sources)), \
+                ThreadPoolExecutor(max_workers=min(4, len(self.sources))) as pool:
+            results = list(pool.map(self._scan_source, range(len(self.sources))))
 
-        # Parse File List
-        all_items = []
-        for line in res.stdout.splitlines():
-            if "|" in line:
-                parts = line.strip().split("|", 1)
-                if len(parts) == 2:
-                    ts_str, name = parts
-                    # Ignore hidden/thumbs
-                    if name.startswith("."): continue
-                    all_items.append({
-                        "name": name, 
-                        "ts_raw": ts_str,
-                        "date": parse_timestamp(ts_str)
-                    })
+        if self.stop_event.is_set():
+            self._log("[STOP] Stopped during scan.")
+            self.bus.publish(WiggleStop())
+            self.bus.publish(Done(0, 0, "0s", False))
+            return
 
-        # Apply Filters (Phase 2)
-        filtered_files = []
-        ignored_count = 0
-        
-        for item in all_items:
-            ok, reason = should_process(item["name"], item["date"], self.config)
-            if ok:
-                filtered_files.append(item)
-            else:
-                ignored_count += 1
-                # self._log(f"[FILTER] Skip {item['name']}: {reason}") # Too verbose?
+        for err in self.scan_errors:
+            self._log(f"[ERR] Scan failed: {err}")
+        if all(r is None for r in results):
+            self.bus.publish(Error("Scan failed (stat required):\n" + "\n".join(self.scan_errors)))
+            self.bus.publish(WiggleStop())
+            return
 
-        if ignored_count > 0:
-            self._log(f"(!) Filter Active: Ignored {ignored_count} files.")
+        # Merge into one global listing / queue
+        self.listing = Listing()
+        queue_idx = array("I")
+        self.source_stats = {}
+        for src, result in zip(self.sources, results):
+            if result is None: continue
+            listing, idx = result
+            offset = len(self.listing)
+            self.listing.extend(listing)
+            queue_idx.extend(offset + i for i in idx)
+            self.source_stats[src["label"]] = [0, 0]
+        listing = self.listing
+        labels = [src["label"] for src in self.sources]
+        dests = [[src["dest"]] + src["mirrors"] for src in self.sources]
 
-        # Apply Sorting (Phase 1 logic adapted)
+        # Apply Sorting / transfer order (pluggable, see core.scheduling)
         sort_order = self.config.get("sort_order", "Oldest First")
-        if sort_order == "Oldest First":
-            filtered_files.sort(key=lambda x: x["date"])
-        elif sort_order == "Newest First":
-            filtered_files.sort(key=lambda x: x["date"], reverse=True)
-        elif sort_order == "Name (A-Z)":
-            filtered_files.sort(key=lambda x: x["name"])
-        elif sort_order == "Name (Z-A)":
-            filtered_files.sort(key=lambda x: x["name"], reverse=True)
+        with self.tracer.span("schedule", order=sort_order, files=len(queue_idx)):
+            queue_idx = schedule(listing, queue_idx, sort_order)
+
+        # Skip what the manifest says is already backed up
+        with self.tracer.span("manifest filter"):
+            self.manifest = Manifest(self.config["last_dest"])
+            self.mirror_manifests = [Manifest(root) for root in self.mirror_roots]
+            manifests = [self.manifest] + self.mirror_manifests
+            before = len(queue_idx)
+            # With mirrors, a file counts as synced only once every copy is recorded
+            queue_idx = listing.filter(queue_idx, lambda i: not all(
+                m.has(listing.path(i), listing.sizes[i]) for m in manifests))
+        skipped = before - len(queue_idx)
+        if skipped > 0:
+            self._log(f"(!) Manifest: {skipped} files already synced, skipping.")
 
         # Apply Limit
         limit = self.config.get("limit_n", 0)
+        # Set once part of the plan is left out on purpose (limit, space trim)
+        cut = False
         if limit > 0:
-            filtered_files = filtered_files[:limit]
+            cut = len(queue_idx) > limit
+            queue_idx = queue_idx[:limit]
             self._log(f"(!) Limit Active: Processing first {limit} matches.")
 
-        total = len(filtered_files)
-        if total == 0:
+        # Disk-space preflight
+        reserve = self.config.get("space_reserve_mb", 512) * 1024 * 1024
+        with self.tracer.span("space preflight"):
+            space = check_space(listing, queue_idx, dests, reserve)
+        short = [(folder, needed, free) for folder, needed, free in space if free is not None and needed > free]
+
+        if self.config.get("dry_run", False):
+            self.bus.publish(WiggleStop())
+            self.bus.publish(PlanDone(self._format_plan(queue_idx, labels, skipped, space)))
+            return
+
+        if short:
+            for folder, needed, free in short:
+                self._log(f"[SPACE] {folder}: need {format_bytes(needed)}, free {format_bytes(max(free, 0))}")
+            if self.config.get("space_policy", "abort") == "trim":
+                kept = trim_to_fit(listing, queue_idx, dests, reserve)
+                self._log(f"(!) Not enough space: queue trimmed to {len(kept)} of {len(queue_idx)} files.")
+                cut = cut or len(kept) < len(queue_idx)
+                queue_idx = kept
+            else:
+                self.bus.publish(Error("Not enough free space at destination:\n" + "\n".join(
+                    f"{folder}: need {format_bytes(needed)}, free {format_bytes(max(free, 0))}" for folder, needed, free in short)))
+                self.bus.publish(WiggleStop())
+                return
+
+        total = len(queue_idx)
+        live = self.config.get("live_feed", False)
+        if total == 0 and not live:
             self._log("No files matched criteria.")
-            self.queue.put(("done", 0, 0, "0s"))
-            self.queue.put(("wiggle_stop",))
+            self.bus.publish(Done(0, 0, "0s", not (cut or self.scan_errors)))
+            self.bus.publish(WiggleStop())
             return
 
-        self._log(f"Queue: {total} files ready.")
+        for i in queue_idx:
+            self.source_stats[labels[listing.source_ids[i]]][1] += 1
+        if len(self.source_stats) > 1:
+            for label, (_, count) in self.source_stats.items():
+                self._log(f"  {label}: {count} files")
+        total_bytes = sum(max(listing.sizes[i], 0) for i in queue_idx)
+        self._log(f"Queue: {total} files ready ({format_bytes(total_bytes)}).")
+        link = self.model.get(self.source.serial, self.transport)
+        estimate = self.model.estimate(self.source.serial, self.transport)
+        if estimate:
+            eta = estimate_seconds(total_bytes, total, *estimate)
+            self._log(f"[PLAN] Estimated time: {format_time(eta)} ({self.transport}, {link['runs']} run(s) measured)")
         
-        processed = 0
-        deleted = 0
-        start_time = time.time()
-        local_dir = self.config["last_dest"]
-        smart_sort = self.config.get("smart_sort", True)
-        delete_after = self.config.get("delete_after", False)
-
-        for i, item in enumerate(filtered_files):
-            if self.stop_event.is_set(): break
+        self.processed = 0
+        self.deleted = 0
+        self.bytes_pulled = 0
+        self.reconnects = 0
+        self.retries = 0
+        self.time_lost = 0.0
+        self.lost_device = False
+        self.total = total
+        self.start_time = start_time = time.time()
+        self.stats_lock = threading.Lock()
+        self.link_lock = threading.Lock()
+        self.link_epoch = 0
+        self.claims = set()
+        self.pull_samples = []
+        self.claims_cv = threading.Condition()
+        self.deleter = self.source.deleter(self._on_deleted)
+        self.verify_failed = 0
+
+        # Write-behind: pulls land on fast local scratch, the place workers
+        # flush them to the (network) destination in the background
+        self.scratch = self.config.get("scratch_dir", "")
+        self.scratch_limit = self.config.get("scratch_limit_mb", 4096) * 1024 * 1024
+        self.scratch_used = 0
+        self.scratch_peak = 0
+        self.scratch_cv = threading.Condition()
+        self.flush_retries = 0
+
+        # Mirrors: one pull, copied to every extra destination by the replicate stage.
+        # With scratch, the scratch file is the copy source and lives until then.
+        # Archive mode: files are appended to per-month tars instead of YYYY-MM folders
+        self.archive_mode = self.config.get("output_mode", "files") == "archive"
+        self.archive_sets = {}
+        self.archive_lock = threading.Lock()
+        self.hold_temp = bool((self.scratch or self.archive_mode) and self.mirror_roots)
+        self.mirror_pool = ThreadPoolExecutor(max_workers=len(self.mirror_roots)) if self.mirror_roots else None
+
+        # Capture-date mode: headers are parsed by the placement workers
+        dated = self.config.get("smart_sort", True) or self.config.get("output_mode", "files") == "archive"
+        self.place_capture = dated and self.config.get("date_source", "mtime") == "capture"
+
+        # scan -> transfer -> place -> verify -> delete, joined by bounded queues
+        # Parallel pulls: fixed, or hill-climbed from the best count seen on this link
+        pulls = self.config.get("transfer_workers", 1)
+        max_pulls = None
+        autotune = self.config.get("autotune", True)
+        if autotune:
+            max_pulls = max(pulls, self.config.get("transfer_workers_max", 4))
+            if link: pulls = min(link.get("workers", pulls), max_pulls)
+        stages = [
+            Stage("transfer", self._transfer_stage, pulls, logger=self._log, max_workers=max_pulls, tracer=self.tracer),
+            Stage("place", self._place_stage, self.config.get("place_workers", 2), logger=self._log, tracer=self.tracer),
+            Stage("verify", self._verify_stage, self.config.get("verify_workers", 2), logger=self._log, tracer=self.tracer),
+            Stage("delete", self._delete_stage, 1, on_close=self._close_deleter, logger=self._log, tracer=self.tracer),
+        ]
+        if self.mirror_pool:
+            stages.insert(2, Stage("replicate", self._replicate_stage, self.config.get("place_workers", 2), logger=self._log, tracer=self.tracer))
+        pipeline = Pipeline(stages)
+        with self.tracer.span("pipeline", files=total):
+            pipeline.start()
+            tuner = None
+            if autotune and max_pulls > 1:
+                tuner = Autotuner(stages[0], lambda: self.bytes_pulled, high=max_pulls,
+                                  stop_event=self.stop_event, logger=self._log)
+                tuner.start()
+            for row in queue_idx:
+                if self.stop_event.is_set() or self.lost_device: break
+                pipeline.put(self._item(row))
+            if live and not (self.stop_event.is_set() or self.lost_device):
+                with self.tracer.span("live feed"):
+                    self._follow_feed(pipeline)
+            # Files already pulled are complete: they are still placed when stopping,
+            # so the manifest matches what is on disk
+            pipeline.close()
+            if tuner: tuner.stop()
+        if self.mirror_pool: self.mirror_pool.shutdown()
+        for archives in self.archive_sets.values():
+            archives.close()
+        for line in pipeline.report():
+            self._log(line)
+
+        if self.lost_device:
+            self._log(f"[ERR] Device {self.source.serial or ''} did not come back, stopping run.")
+        if self.stop_event.is_set():
+            self._log(f"[STOP] Stopped by user after {self.processed}/{self.total} files.")
+            self.source.reset_cancel()
+
+        processed, deleted = self.processed, self.deleted
+        elapsed = time.time() - start_time - self.time_lost
+        if self.bytes_pulled > 1024 * 1024 and elapsed > 0:
+            self.bus.publish(Throughput(self.bytes_pulled / elapsed))
+        best_pulls = tuner.best[1] if tuner and tuner.best[0] > 0 else stages[0].limit
+        rec = self.model.update(self.source.serial, self.transport, self.pull_samples, elapsed, best_pulls)
+        if rec:
+            self.model.save()
+            self._log(f"[TUNE] {self.transport}: {format_bytes(rec['bps'])}/s per pull, "
+                      f"{rec['overhead_s'] * 1000:.0f} ms per file, best {rec['workers']} pull(s)")
+        if deleted > 0:
+            self.source.after_delete()
+
+        if len(self.source_stats) > 1:
+            for label, (done, count) in self.source_stats.items():
+                self._log(f"  {label}: {done}/{count} done")
+        if self.verify_failed:
+            self._log(f"[WARN] {self.verify_failed} files failed post-copy verification (not deleted, not in manifest).")
+        if self.scratch:
+            self._report_scratch()
+        if self.reconnects or self.retries:
+            self._log(f"[STATS] Reconnects: {self.reconnects}, retried files: {self.retries}, time lost: {format_time(self.time_lost)}")
+
+        # Every planned file placed and verified: nothing left for a later run
+        complete = (not (cut or self.scan_errors or self.verify_failed or self.lost_device or self.stop_event.is_set())
+                    and processed == self.total)
+        total_time = format_time(time.time() - start_time)
+        self.bus.publish(Progress(100, "Done"))
+        self.bus.publish(WiggleStop())
+        self.bus.publish(Jump())
+        self.bus.publish(Done(processed, deleted, total_time, complete))
+
+    def _follow_feed(self, pipeline):
+        """Live session: keeps the pipeline open and queues new files as the
+        phone writes them, until Stop (or the device stays away)."""
+        listing = self.listing
+        folders = {src["remote_path"]: i for i, src in enumerate(self.sources) if src["label"] in self.source_stats}
+        manifests = [self.manifest] + self.mirror_manifests
+        arrived = queue.Queue()
+        feed = self.source.change_feed(list(folders), lambda *rec: arrived.put(rec),
+                                       ((listing.path(i), listing.sizes[i]) for i in range(len(listing))),
+                                       self.config.get("live_poll_s", 2), self.stop_event, self._log)
+        if feed is None:
+            self._log(f"[LIVE] No change feed for {self.source.kind} sources.")
+            return
+        feed.start()
+        timeout = self.config.get("reconnect_timeout_s", 60)
+        self.bus.publish(Status("Live: waiting for new files..."))
+        while not self.stop_event.is_set() and not self.lost_device:
+            if feed.down_since and time.time() - feed.down_since > timeout:
+                self._log(f"[LIVE] Device {self.source.serial or ''} gone for {timeout}s, ending live session.")
+                break
+            try:
+                folder, name, mtime, size = arrived.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            source_id = folders[folder]
+            src = self.sources[source_id]
+            i = len(listing)
+            listing.append(name, folder, mtime, size, source_id)
+            kept, _ = filter_indices(listing, array("I", [i]), src)
+            if not kept or all(m.has(listing.path(i), size) for m in manifests): continue
+            with self.stats_lock:
+                self.total += 1
+                self.source_stats[src["label"]][1] += 1
+            self._log(f"[LIVE] New: {name}")
+            pipeline.put(self._item(i))
+        feed.stop()
+        feed.join(5)
+
+    def _recover(self):
+        """After a failed pull: None if the device is still online (a real failure),
+        True once the same serial is back, False if it stayed away too long."""
+        if self.source.is_online(): return None
+        if self.stop_event.is_set(): return False
+
+        self.reconnects += 1
+        self._log(f"[LINK] Device {self.source.serial or ''} lost, pausing queue...")
+        self.bus.publish(Status("Waiting for device to reconnect..."))
+        self.tracer.instant("device lost", serial=self.source.serial)
+        started = time.time()
+        timeout = self.config.get("reconnect_timeout_s", 60)
+        delay = 0.5
+        while time.time() - started < timeout:
+            if self.stop_event.wait(delay): break
+            if self.source.is_online():
+                lost = time.time() - started
+                self.time_lost += lost
+                self._log(f"[LINK] Device back after {lost:.1f}s, resuming.")
+                self.tracer.instant("device back", lost_s=round(lost, 1))
+                self.link_epoch += 1
+                return True
+            delay = min(delay * 2, 5)
+        self.time_lost += time.time() - started
+        return False
+
+    def _pull(self, item, temp_local_path):
+        """Pulls into '<name>.part' and renames on success, so a broken pull is
+        never mistaken for a finished file. Big files go through the resumable
+        chunked path."""
+        size = item["size"] or 0
+        with self.tracer.span("pull", "transfer", name=item["name"], size=size) as span:
+            ok = self._pull_file(item, temp_local_path)
+            span.set(ok=ok)
+        return ok
+
+    def _pull_file(self, item, temp_local_path):
+        return self.source.pull(item["path"], temp_local_path, item["size"] or 0, item["mtime"],
+                                self.stop_event, self._log)
+
+    # --- Write-behind scratch ---
+    def _reserve_scratch(self, size):
+        """Blocks the pull until the scratch dir has room (one file always fits)."""
+        with self.scratch_cv:
+            while self.scratch_used and self.scratch_used + size > self.scratch_limit and not self.stop_event.is_set():
+                self.scratch_cv.wait(0.5)
+            self.scratch_used += size
+            self.scratch_peak = max(self.scratch_peak, self.scratch_used)
+
+    def _release_scratch(self, size):
+        with self.scratch_cv:
+            self.scratch_used -= size
+            self.scratch_cv.notify_all()
+
+    def _move(self, src, dst):
+        """Moves a file into the destination. From scratch it is copied out
+        (see _copy_out); the scratch file stays if mirrors still need it."""
+        if not self.scratch:
+            shutil.move(src, dst)
+            return
+        self._copy_out(src, dst)
+        if not self.hold_temp: os.remove(src)
+
+    def _copy_out(self, src, dst):
+        """Copies to '<dst>.part' and renames, retried with backoff, so a flaky
+        share never leaves a half-written file under the final name."""
+        part = dst + ".part"
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                shutil.copyfile(src, part)
+                shutil.copystat(src, part)
+                os.replace(part, dst)
+                break
+            except OSError as e:
+                try:
+                    os.remove(part)
+                except OSError:
+                    pass
+                if attempt == MAX_RETRIES: raise
+                self._log(f"[FLUSH] {os.path.basename(dst)}: {e}, retrying...")
+                with self.stats_lock: self.flush_retries += 1
+                time.sleep(2 ** attempt)
 
-            filename = item["name"]
-            remote_path = f"{remote_dir}/{filename}"
-            temp_local_path = os.path.join(local_dir, filename)
-            
-            # ETA
-            elapsed = time.time() - start_time
-            if i > 0:
-                avg = elapsed / i
-                eta = format_time(avg * (total - i))
-            else: eta = "..."
-            
-            pct = ((i) / total) * 100
-            self.queue.put(("progress", pct, f"[{i+1}/{total}] {filename} | ETA: {eta}"))
-
-            # Logic mostly same as before, but using pulled timestamp info
-            should_pull = True
-            if os.path.exists(temp_local_path) and os.path.getsize(temp_local_path) > 0:
+    def _done_with_temp(self, item, remove=False):
+        """Releases the temp path claim (and scratch budget) of one item."""
+        if remove:
+            try:
+                os.remove(item["temp"])
+            except OSError:
+                pass
+        if item["reserved"]: self._release_scratch(item["reserved"])
+        self._release(item["temp"])
+
+    def _report_scratch(self):
+        try:
+            left = [n for n in os.listdir(self.scratch) if not n.endswith((".part", ".part.json"))]
+        except OSError:
+            left = []
+        self._log(f"[SCRATCH] Peak {format_bytes(self.scratch_peak)} of {format_bytes(self.scratch_limit)}, flush retries: {self.flush_retries}")
+        if left:
+            self._log(f"[WARN] {len(left)} files could not be flushed and stay in {self.scratch} (flushed on the next run).")
+
+    # --- Pipeline stages ---
+    def _claim(self, path):
+        """Only one file per temp path in flight (same name from two folders).
+        Returns False if the run was stopped while waiting."""
+        with self.claims_cv:
+            while path in self.claims:
+                if self.stop_event.is_set(): return False
+                self.claims_cv.wait(0.5)
+            self.claims.add(path)
+            return True
+
+    def _release(self, path):
+        with self.claims_cv:
+            self.claims.discard(path)
+            self.claims_cv.notify_all()
+
+    def _transfer_stage(self, item):
+        if self.stop_event.is_set() or self.lost_device: return None
+        filename = item["name"]
+        temp_dir = self.scratch or item["dest"]
+        temp_local_path = os.path.join(temp_dir, filename)
+        item["temp"] = temp_local_path
+        item["reserved"] = 0
+        if not self._claim(temp_local_path): return None
+        # Until the item is handed on, the claim and scratch reservation are ours to release
+        handed_on = False
+        try:
+            result = self._transfer(item, filename, temp_dir, temp_local_path)
+            handed_on = result is not None
+            return result
+        finally:
+            if not handed_on: self._done_with_temp(item)
+
+    def _transfer(self, item, filename, temp_dir, temp_local_path):
+        # Logic mostly same as before, but using pulled timestamp info
+        should_pull = True
+        if os.path.exists(temp_local_path) and os.path.getsize(temp_local_path) > 0:
+            # A leftover of the wrong size is a broken copy, not a finished one
+            if item["size"] is None or os.path.getsize(temp_local_path) == item["size"]:
                 should_pull = False
-            
-            if should_pull:
-                pull_res = self.adb.run(["pull", "-a", remote_path, temp_local_path])
-                if pull_res.returncode != 0:
+        item["pulled"] = should_pull
+
+        if should_pull:
+            os.makedirs(temp_dir, exist_ok=True)
+            if self.scratch:
+                item["reserved"] = item["size"] or 0
+                self._reserve_scratch(item["reserved"])
+            epoch = self.link_epoch
+            t0 = time.perf_counter()
+            ok = self._pull(item, temp_local_path)
+            if ok:
+                # Clean first-attempt pulls feed the throughput model
+                with self.stats_lock: self.pull_samples.append((item["size"] or 0, time.perf_counter() - t0))
+            attempts = 0
+            # Transport dropped (loose cable)? Wait for the same device, then retry this file
+            while not ok and not self.stop_event.is_set() and not self.lost_device and attempts < MAX_RETRIES:
+                with self.link_lock:
+                    # Another transfer worker may already have waited out this dropout
+                    recovered = True if self.link_epoch != epoch else self._recover()
+                if recovered is None: break  # device is fine, this file just failed
+                if not recovered:
+                    self.lost_device = True
+                    break
+                attempts += 1
+                with self.stats_lock: self.retries += 1
+                epoch = self.link_epoch
+                ok = self._pull(item, temp_local_path)
+            if not ok:
+                if not self.stop_event.is_set() and not self.lost_device:
                     self._log(f"[FAIL] {filename}")
-                    continue
-
-            # Smart Sort
-            final_path = temp_local_path
-            if smart_sort and os.path.exists(temp_local_path):
-                # Use item["date"] which we already have!
-                folder_name = item["date"].strftime("%Y-%m")
-                target_folder = os.path.join(local_dir, folder_name)
+                return None
+            with self.stats_lock: self.bytes_pulled += item["size"] or 0
+        return item
+
+    def _place_stage(self, item):
+        """Smart-sorts one transferred file and records it in the manifest."""
+        placed = False
+        try:
+            date = None
+            if self.place_capture:
+                date = self.capture_dates.get(item["path"])
+                if date is None:
+                    with self.tracer.span("capture date", "fs", name=item["name"]):
+                        # Cached under the source file: the temp path changes every run
+                        date = self.resolver.resolve(item["temp"], self.source.date_key(item["path"], item["size"], item["mtime"]))
+            item["placed_date"] = date or item["date"]
+            if self.archive_mode:
+                item["final"] = self._pack(item["temp"], item["dest"], item)
+            else:
+                item["final"] = self._place(item, item["temp"], item["pulled"], date)
+            placed = True
+        finally:
+            if not (self.hold_temp and placed): self._done_with_temp(item)
+        if (self.scratch or self.archive_mode) and item["final"] == item["temp"]:
+            # Never reached the destination: not verified, not in the manifest
+            if self.hold_temp: self._done_with_temp(item)
+            self._log(f"[FLUSH FAIL] {item['name']} kept in {os.path.dirname(item['temp'])}")
+            return None
+
+        with self.stats_lock:
+            self.processed += 1
+            self.source_stats[item["source"]][0] += 1
+            done = self.processed
+        elapsed = time.time() - self.start_time
+        eta = format_time(elapsed / done * (self.total - done)) if done else "..."
+        per_source = self._source_progress()
+        if per_source: per_source = f" | {per_source}"
+        self.bus.publish(Progress(done / self.total * 100, f"[{done}/{self.total}] {item['name']}{per_source} | ETA: {eta}"))
+        return item
+
+    def _replicate_stage(self, item):
+        """Copies the placed file to every mirror root, same relative path, in parallel."""
+        src = item["temp"] if self.hold_temp else item["final"]
+        if self.archive_mode:
+            copy = lambda root: self._pack(src, root, item, mirror=True)
+        else:
+            rel = os.path.relpath(item["final"], item["dest"])
+            copy = lambda root: self._replicate(src, os.path.join(root, rel), item["name"])
+        try:
+            item["copies"] = list(self.mirror_pool.map(copy, item["mirrors"]))
+        finally:
+            if self.hold_temp: self._done_with_temp(item, remove=True)
+        return item
+
+    def _replicate(self, src, dst, name):
+        """Returns the mirror copy's path, or None if it could not be written."""
+        reserved = None
+        try:
+            with self.tracer.span("mirror copy", "fs", name=name, dest=dst):
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                if not reserve_name(dst):
+                    if os.path.getsize(dst) == os.path.getsize(src): return dst
+                    dst = reserve_free_name(dst)
+                reserved = dst
+                self._copy_out(src, dst)
+            return dst
+        except OSError as e:
+            self._log(f"[MIRROR] {name} -> {dst}: {e}")
+            if reserved: self._drop_placeholder(reserved)
+            return None
+
+    @staticmethod
+    def _drop_placeholder(path):
+        """Removes a reserved name that never got its file (still empty)."""
+        try:
+            if os.path.getsize(path) == 0: os.remove(path)
+        except OSError:
+            pass
+
+    # --- Archive mode ---
+    def _archive_set(self, root):
+        # One ArchiveSet (so one open handle per tar) whatever the spelling of
+        # the root: "dst/", "dst" and a ref's dirname must all land on the same key
+        root = os.path.normcase(os.path.abspath(root))
+        with self.archive_lock:
+            archives = self.archive_sets.get(root)
+            if archives is None:
+                archives = self.archive_sets[root] = ArchiveSet(root)
+            return archives
+
+    def _pack(self, src, root, item, mirror=False):
+        """Appends a file to root/YYYY-MM.tar. Returns the member reference;
+        on failure the source path (primary) or None (mirror)."""
+        try:
+            with self.tracer.span("pack", "fs", name=item["name"], size=item["size"] or 0):
+                ref = self._archive_set(root).store(src, item["name"], item["placed_date"], item["mtime"])
+        except OSError as e:
+            self._log(f"[ERR] Pack {item['name']} -> {root}: {e}")
+            return None if mirror else src
+        if not mirror and not self.hold_temp:
+            try:
+                os.remove(src)
+            except OSError:
+                pass
+        return ref
+
+    def _archive_member(self, ref):
+        archive_path = ref.split("::", 1)[0]
+        return self._archive_set(os.path.dirname(archive_path)).lookup(ref)
+
+    def _verify_stage(self, item):
+        """Post-copy integrity check, run alongside the next transfers: the local
+        size must equal the scanned remote size (and the md5, if enabled).
+        Only verified files enter the manifest or get their original deleted."""
+        final_path = item["final"]
+        expected = item["size"]
+        ok, local_size = self._size_ok(final_path, expected)
+        reason = f"local {local_size} B, phone {expected} B"
+        if ok and self.config.get("verify_hash", False):
+            with self.tracer.span("verify hash", "transfer", name=item["name"], size=expected):
+                remote_md5, local_md5 = self._hashes(item["path"], final_path)
+            # Stopped while hashing: unverified, but not a failed copy
+            if self.stop_event.is_set() and not (remote_md5 and local_md5): return None
+            ok = bool(remote_md5) and remote_md5 == local_md5
+            # The device re-checks this hash right before deleting
+            if ok: item["md5"] = remote_md5
+            elif not remote_md5: reason = "md5 unavailable on the phone"
+            elif not local_md5: reason = "local copy unreadable"
+            else: reason = f"md5 local {local_md5}, phone {remote_md5}"
+        if not ok:
+            self._log(f"[VERIFY FAIL] {item['name']}: {reason}")
+            with self.stats_lock: self.verify_failed += 1
+            return None
+
+        # Unknown listing size: what was verified is what the device re-checks before delete
+        if item["size"] is None: item["size"] = local_size
+        with self.tracer.span("manifest record", "fs"):
+            self.manifest.record(item["path"], item["size"], final_path)
+
+        # Mirror copies are checked against the same size; delete needs all of them
+        all_ok = True
+        for manifest, copy_path in zip(self.mirror_manifests, item.get("copies", [])):
+            copy_ok = False
+            if copy_path:
+                copy_ok, copy_size = self._size_ok(copy_path, expected)
+                if not copy_ok: self._log(f"[VERIFY FAIL] {item['name']}: mirror copy {copy_size} B, phone {expected} B")
+            if copy_ok:
+                manifest.record(item["path"], item["size"], copy_path)
+            else:
+                all_ok = False
+        if not all_ok:
+            with self.stats_lock: self.verify_failed += 1
+            return None
+        if not self.config.get("delete_after", False): return None
+        return item
+
+    def _size_ok(self, path, expected):
+        """(matches, local size). A known remote size (0 included) must match exactly;
+        without one (None) any non-empty file passes."""
+        if self.archive_mode:
+            arc, name = self._archive_member(path)
+            local_size = arc.get(name)
+            if local_size is None: local_size = -1
+        else:
+            try:
+                local_size = os.path.getsize(path)
+            except OSError:
+                local_size = -1
+        return (local_size == expected if expected is not None else local_size > 0), local_size
+
+    def _hashes(self, remote_path, local_path):
+        """(remote md5, local md5); either is None if it could not be computed."""
+        remote_md5 = self.source.md5(remote_path)
+        if not remote_md5: return None, None
+        try:
+            if self.archive_mode:
+                # Hash the member in place, straight from its offset in the tar
+                arc, name = self._archive_member(local_path)
+                return remote_md5, md5_hex(arc.read_member(name))
+            return remote_md5, md5_hex(read_blocks(local_path))
+        except OSError:
+            return remote_md5, None
+
+    def _delete_stage(self, item):
+        # Deferred remote deletion: streamed to one device shell that re-checks
+        # each file (size, mtime, md5 when known) right before removing it
+        if not self.deleter.submit(item["path"], item["size"], item.get("remote_mtime"), item.get("md5"), tag=item):
+            self._log(f"[DEL FAIL] {item['name']}: delete shell unavailable")
+        return None
+
+    def _on_deleted(self, item, status):
+        if status == "DELETED":
+            self._log(f"[DEL] {item['name']}")
+            with self.stats_lock: self.deleted += 1
+        elif status == "CHANGED":
+            self._log(f"[DEL SKIP] {item['name']}: changed on the phone since the copy, kept")
+        elif status == "GONE":
+            self._log(f"[DEL SKIP] {item['name']}: no longer on the phone")
+        else:
+            self._log(f"[DEL FAIL] {item['name']}")
+
+    def _close_deleter(self):
+        with self.tracer.span("delete drain"):
+            left = self.deleter.close()
+        for item in left:
+            self._log(f"[DEL FAIL] {item['name']}: no answer from the device, kept")
+
+    def _place(self, item, temp_local_path, should_pull, date):
+        """Smart-sorts one transferred file. Returns where it ended up."""
+        filename = item["name"]
+        local_dir = item["dest"]
+        if date is None: date = item["date"]
+
+        # Smart Sort (from scratch, files go to the destination root without it)
+        final_path = temp_local_path
+        smart = self.config.get("smart_sort", True)
+        if (smart or self.scratch) and os.path.exists(temp_local_path):
+            target_folder = os.path.join(local_dir, date.strftime("%Y-%m")) if smart else local_dir
+            with self.tracer.span("makedirs", "fs", path=target_folder):
                 os.makedirs(target_folder, exist_ok=True)
-                sorted_path = os.path.join(target_folder, filename)
-                
-                try:
-                    if os.path.exists(sorted_path):
-                        if os.path.getsize(sorted_path) == os.path.getsize(temp_local_path):
-                            if should_pull: os.remove(temp_local_path)
-                            final_path = sorted_path
-                        else:
-                            # Rename collision
-                            base, ext = os.path.splitext(filename)
-                            new_name = f"{base}_{int(time.time())}{ext}"
-                            sorted_path = os.path.join(target_folder, new_name)
-                            shutil.move(temp_local_path, sorted_path)
-                            final_path = sorted_path
-                            self._log(f"[SORT] Renamed: {new_name}")
-                    else:
-                        shutil.move(temp_local_path, sorted_path)
-                        final_path = sorted_path
-                except Exception as e:
-                    self._log(f"[ERR] Sort: {e}")
-
-            # Delete
-            if delete_after:
-                if os.path.exists(final_path) and os.path.getsize(final_path) > 0:
-                    self.adb.run(["shell", "rm", f"'{remote_path}'"])
-                    deleted += 1
-                    self._log(f"[DEL] {filename}")
-
-            processed += 1
+            sorted_path = os.path.join(target_folder, filename)
+            if os.path.abspath(sorted_path) == os.path.abspath(temp_local_path): return final_path
 
-        if deleted > 0:
-            self.adb.scan_media()
+            reserved = None
+            try:
+                # The name is reserved before the move: another placement worker
+                # with a same-named file can never pick the same target
+                if not reserve_name(sorted_path):
+                    if os.path.getsize(sorted_path) == os.path.getsize(temp_local_path):
+                        if (should_pull or self.scratch) and not self.hold_temp:
+                            with self.tracer.span("remove duplicate", "fs", name=filename):
+                                os.remove(temp_local_path)
+                        return sorted_path
+                    # Rename collision
+                    sorted_path = reserve_free_name(sorted_path)
+                    self._log(f"[SORT] Renamed: {os.path.basename(sorted_path)}")
+                reserved = sorted_path
+                with self.tracer.span("move", "fs", name=os.path.basename(sorted_path), size=item["size"] or 0):
+                    self._move(temp_local_path, sorted_path)
+                final_path = sorted_path
+            except Exception as e:
+                self._log(f"[ERR] Sort: {e}")
+                if reserved: self._drop_placeholder(reserved)
 
-        total_time = format_time(time.time() - start_time)
-        self.queue.put(("progress", 100, "Done"))
-        self.queue.put(("wiggle_stop",))
-        self.queue.put(("jump",))
-        self.queue.put(("done", processed, deleted, total_time))
+        return final_path
+
+    def _format_plan(self, queue_idx, labels, skipped, space):
+        bps = self.config.get("measured_bps", 0)
+        per_file_s = None
+        estimate = self.model.estimate(self.source.serial, self.transport)
+        if estimate: bps, per_file_s = estimate
+        plan = build_plan(self.listing, queue_idx, labels, skipped, bps, per_file_s)
+        lines = [f"Files to copy: {plan['files']} ({format_bytes(plan['bytes'])})",
+                 f"Already synced (manifest): {plan['skipped']}"]
+        if len(plan["per_source"]) > 1:
+            for label, (count, size) in plan["per_source"].items():
+                lines.append(f"  {label}: {count} files, {format_bytes(size)}")
+        for folder, needed, free in space:
+            if free is None: continue
+            state = "OK" if needed <= free else "NOT ENOUGH SPACE"
+            lines.append(f"{folder}: need {format_bytes(needed)}, free {format_bytes(max(free, 0))} - {state}")
+        if estimate: basis = f"{self.transport} link model, {format_bytes(bps)}/s"
+        elif plan["measured"]: basis = f"measured {format_bytes(bps)}/s"
+        else: basis = "default speed, no run measured yet"
+        lines.append(f"Estimated time: {format_time(plan['eta_s'])} ({basis})")
+        for line in lines: self._log(f"[PLAN] {line}")
+        return "\n".join(lines)
+
+    def _source_progress(self):
+        if len(self.source_stats) < 2: return ""
+        return " · ".join(f"{label} {done}/{count}" for label, (done, count) in self.source_stats.items())
 
     def stop(self):
+        """Stops within a second: the in-flight adb command is killed, not awaited."""
         self.stop_event.set()
+        self.source.cancel()
 
 # We keep VerifyWorker largely the same but ensure it imports properly
 class VerifyWorker(threading.Thread):
-    def __init__(self, config, ui_queue):
+    def __init__(self, config, bus):
         super().__init__(daemon=True)
         self.config = config
-        self.queue = ui_queue
-        self.adb = AdbWrapper(config["adb_path"], config["debug_mode"])
+        self.bus = bus
+        self.tracer = Tracer()
+        self.source = make_source(config, tracer=self.tracer)
         self.remote_dir = config["remote_path"].rstrip("/")
         self.local_dir = config["last_dest"]
         self.safe_to_delete = []
+        self.safe_records = []
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+        self.source.cancel()
+
+    def _index_local(self):
+        """Stage 1: streams the archive into a compact fingerprint matcher."""
+        try:
+            with self.tracer.span("index local", "fs") as span:
+                self._walk_local()
+                span.set(files=self.local_count)
+            self.matcher.freeze()
+        except Exception as e:
+            self.failure = f"Indexing PC failed: {e}"
+        finally:
+            # Always signalled, so the matching loop never waits forever
+            self.local_ready.set()
+
+    def _walk_local(self):
+        stack = [self.local_dir]
+        while stack and not self.stop_event.is_set():
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False): stack.append(entry.path)
+                            elif (entry.name.endswith(INDEX_SUFFIX) and entry.is_file()
+                                  and os.path.isfile(entry.path[:-len(INDEX_SUFFIX)])):
+                                # Packed month archive: its index stands in for the files
+                                # (an .idx without its tar, e.g. VobSub subtitles, is a plain file)
+                                self.local_count += self.matcher.add_archive(entry.path)
+                            elif entry.is_file():
+                                self.matcher.add(entry.name, entry.stat().st_size)
+                                self.local_count += 1
+                        except OSError: pass
+            except OSError: pass
+
+    def _list_remote(self):
+        """Stage 2: streams the phone's listing; each record is queued as it arrives."""
+        try:
+            with self.tracer.span("list remote"):
+                self._stream_remote()
+        except Exception as e:
+            self.failure = f"Listing phone failed: {e}"
+        finally:
+            self.listing_done.set()
+            self.remote_rows.put(None)
+
+    def _stream_remote(self):
+        for name, mtime, size in self.source.iter_files(self.remote_dir):
+            if self.stop_event.is_set(): break
+            self.remote.append(name, self.remote_dir, mtime or 0, size)
+            self.remote_rows.put(len(self.remote) - 1)
+
+    def _report(self, checked, matched, listing_done):
+        listed = len(self.remote)
+        if not self.local_ready.is_set():
+            text = f"Indexing PC: {self.local_count} files | Phone: {listed} listed"
+            pct = 0
+        else:
+            suffix = "" if listing_done else "+ (listing...)"
+            text = f"Verifying {checked}/{listed}{suffix} | {matched} matched"
+            pct = (checked / listed * (100 if listing_done else 50)) if listed else 0
+        self.bus.publish(Progress(pct, text))
 
     def run(self):
-        self.queue.put(("log", "--- Verify Scan ---"))
-        self.queue.put(("wiggle_start",))
-        
-        # Local Indexing
-        local_index = {}
-        for root, _, files in os.walk(self.local_dir):
-            for f in files:
-                try:
-                    sz = os.path.getsize(os.path.join(root, f))
-                    if f not in local_index: local_index[f] = set()
-                    local_index[f].add(sz)
-                except: pass
-        
-        # Remote Scan (stat)
-        res = self.adb.run(["shell", "cd", f"'{self.remote_dir}'", "&&", "stat", "-c", "'%s|%n'", "*"])
-        items = []
-        if res.returncode == 0:
-            for line in res.stdout.splitlines():
-                if "|" in line: items.append(line.strip().split("|", 1))
-        
+        trace = self.config.get("trace", False)
+        if trace: self.tracer.start()
+        try:
+            with self.tracer.span("verify run"):
+                self._run()
+        finally:
+            if trace: save_trace(self.tracer, "verify", lambda msg: self.bus.publish(Log(msg)))
+
+    def _run(self):
+        self.bus.publish(Log("--- Verify Scan ---"))
+        self.bus.publish(WiggleStart())
+
+        # Local indexing and the remote listing run side by side; matching
+        # starts as soon as the index is ready and then keeps up with the stream.
+        self.matcher = FingerprintMatcher()
+        self.local_count = 0
+        self.local_ready = threading.Event()
+        self.remote = Listing()
+        self.remote_rows = queue.Queue()
+        self.listing_done = threading.Event()
+        self.failure = None
+        started = time.time()
+        threading.Thread(target=self._index_local, daemon=True).start()
+        threading.Thread(target=self._list_remote, daemon=True).start()
+
+        while not self.local_ready.wait(0.2):
+            self._report(0, 0, self.listing_done.is_set())
+        if self.failure:
+            # Nothing can be called safe to delete without a complete index
+            self.source.cancel()
+            self.bus.publish(Error(self.failure))
+            self.bus.publish(WiggleStop())
+            self.bus.publish(VerifyDone(0, 0, [], []))
+            return
+        if self.config.get("debug_mode", False):
+            self.bus.publish(Log(f"[DEBUG] Local index: {len(self.matcher)} files, {self.matcher.memory_bytes() // 1024} KB, {time.time() - started:.1f}s"))
+
         matched = 0
-        total = len(items)
-        
-        for i, (sz, name) in enumerate(items):
+        checked = 0
+        last_report = 0
+        while True:
             try:
-                size = int(sz)
-                if name in local_index and size in local_index[name]:
-                    self.safe_to_delete.append(name)
-                    matched += 1
-                    self.queue.put(("log", f"[MATCH] {name}"))
-                
-                if i % 50 == 0:
-                    self.queue.put(("progress", (i/total)*100, f"Verifying {i}/{total}"))
-            except: pass
-
-        self.queue.put(("progress", 100, "Done"))
-        self.queue.put(("wiggle_stop",))
-        self.queue.put(("jump",))
-        self.queue.put(("verify_done", total, matched, self.safe_to_delete))
\ No newline at end of file
+                i = self.remote_rows.get(timeout=0.2)
+            except queue.Empty:
+                self._report(checked, matched, self.listing_done.is_set())
+                continue
+            if i is None or self.stop_event.is_set(): break
+            name, size = self.remote.names[i], self.remote.sizes[i]
+            if self.matcher.contains(name, size):
+                self.safe_to_delete.append(name)
+                self.safe_records.append((self.remote.path(i), size, self.remote.mtimes[i] or None))
+                matched += 1
+                self.bus.publish(Log(f"[MATCH] {name}"))
+            checked += 1
+            if time.time() - last_report > 0.2:
+                self._report(checked, matched, self.listing_done.is_set())
+                last_report = time.time()
+        total = checked
+
+        if self.failure:
+            # Matches so far are still real; the rest of the phone was not checked
+            self.bus.publish(Log(f"[ERR] {self.failure}"))
+        if self.stop_event.is_set():
+            self.bus.publish(Log(f"[STOP] Verify stopped, {matched} matches so far."))
+        elif self.config.get("debug_mode", False):
+            self.bus.publish(Log(f"[DEBUG] Verify took {time.time() - started:.1f}s"))
+        self.bus.publish(Progress(100, "Done"))
+        self.bus.publish(WiggleStop())
+        self.bus.publish(Jump())
+        self.bus.publish(VerifyDone(total, matched, self.safe_to_delete, self.safe_records))
@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import queue
+import threading
 import os
 import sys
 import datetime
@@ -8,7 +8,11 @@ import random
 
 from core.settings import load_settings, save_settings, DEFAULT_REMOTE_PATH
 from core.worker import SyncWorker
+from core.watch import DeviceWatcher
 from core.adb import AdbWrapper
+from core.timing import StartupTimer
+from core.events import (EventBus, EventCounter, VOLATILE, dispatch, Log, Status, Progress, WiggleStart, WiggleStop, Jump, Error,
+                         PlanDone, Throughput, Done, DeviceState, WatchTrigger)
 from .widgets import SettingsDialog, CleanupDialog
 
 ICON_FILENAME = "obersturmkiippfuhrer.png"
@@ -23,8 +27,9 @@ FALLBACK_PATHS = [
 ]
 
 class OSKCommanderPro(tk.Tk):
-    def __init__(self):
+    def __init__(self, startup_timer=None):
         super().__init__()
+        self.startup = startup_timer or StartupTimer()
         self.title("OberSturmKlippCommander v6.5 (Release Candidate)")
         self.geometry("700x750")
         
@@ -35,9 +40,23 @@ class OSKCommanderPro(tk.Tk):
         # Persist ADB wrapper for the GUI thread to use for polling
         self.adb = AdbWrapper(self.settings["adb_path"])
         
-        self.queue = queue.Queue()
+        # Warm up the adb server daemon while the UI is being built,
+        # so the first get_state() doesn't freeze the window for 1-3 s.
+        self.adb_ready = threading.Event()
+        threading.Thread(target=self._warm_up_adb, daemon=True).start()
+        
+        # Worker events: the UI drains its own subscription, the log file
+        # is written from a background subscriber so floods don't stall Tk
+        self.bus = EventBus()
+        self.ui_events = self.bus.subscribe(coalesce=VOLATILE, batch=500)
+        self.bus.subscribe_thread(self._write_log_events, kinds=(Log,))
+        self.event_counter = EventCounter(self.bus) if self.settings.get("debug_mode", False) else None
         self.worker = None
         self.current_log_file = None
+        # Watch mode: device events come from track-devices instead of polling
+        self.watcher = None
+        self.watch_run = None
+        self.watch_pending = None
         
         # Wiggle State
         self.wiggle_active = False
@@ -46,11 +65,29 @@ class OSKCommanderPro(tk.Tk):
         self.current_pct = 0
 
         self._build_ui()
+        self.startup.mark("ui built")
+        self.bind("<Map>", self._on_first_map, add="+")
         
         # Start loops
         self.after(500, self.startup_checks)
-        self.after(100, self._process_queue)
+        self.after(100, self._process_events)
         self.after(1000, self.monitor_usb)
+        if self.settings.get("watch_mode", False): self.start_watch()
+
+    def _warm_up_adb(self):
+        self.adb.start_server()
+        self.startup.mark("adb server ready")
+        self.adb_ready.set()
+
+    def _on_first_map(self, event):
+        if event.widget is not self: return
+        self.startup.mark("window shown")
+        self.unbind("<Map>")
+
+    def report_startup(self):
+        if not self.settings.get("debug_mode", False): return
+        for line in self.startup.report():
+            self.log_msg(line)
 
     def resource_path(self, relative_path):
         """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -86,8 +123,29 @@ class OSKCommanderPro(tk.Tk):
             self.settings["adb_path"] = "adb"
 
     def monitor_usb(self):
+        if not self.adb_ready.is_set():
+            self.lbl_usb_status.config(text="USB: Starting ADB...", foreground="gray")
+            self.after(250, self.monitor_usb)
+            return
+
+        if self.watcher and self.startup.has("first device state"):
+            # The watcher reports device changes as they happen
+            self.after(2000, self.monitor_usb)
+            return
+
         state = self.adb.get_state()
-        
+        if not self.startup.has("first device state"):
+            self.startup.mark("first device state")
+            self.report_startup()
+        self._show_usb_state(state)
+        self.after(2000, self.monitor_usb)
+
+    def _show_usb_state(self, state):
+        if self.settings.get("source_backend", "adb") == "local":
+            # Card reader / mounted storage: no phone needed
+            self.lbl_usb_status.config(text="Source: Local folder", foreground="green")
+            if not self.worker: self.btn_start.config(state="normal")
+            return
         if state == "Connected":
             self.lbl_usb_status.config(text="USB: Connected", foreground="green")
             if not self.worker:
@@ -104,14 +162,16 @@ class OSKCommanderPro(tk.Tk):
         else:
             self.lbl_usb_status.config(text="USB: No Device", foreground="red")
             if not self.worker: self.btn_start.config(state="disabled")
-            
-        self.after(2000, self.monitor_usb)
 
     def startup_checks(self):
+        if not self.adb_ready.is_set():
+            self.after(250, self.startup_checks)
+            return
         self.check_remote_path_fallback()
 
     def check_remote_path_fallback(self):
         current_path = self.remote_var.get().strip()
+        if self.settings.get("source_backend", "adb") == "local": return
         if self.adb.get_state() != "Connected": return
         if self.adb.remote_exists(current_path): return
 
@@ -164,11 +224,20 @@ class OSKCommanderPro(tk.Tk):
         # Controls
         self.del_var = tk.BooleanVar(value=self.settings.get("delete_after", False))
         ttk.Checkbutton(main, text="Delete after copy", variable=self.del_var).pack(anchor="w")
+        self.hash_var = tk.BooleanVar(value=self.settings.get("verify_hash", False))
+        ttk.Checkbutton(main, text="Verify copies by hash (slower, safer delete)", variable=self.hash_var).pack(anchor="w")
+        self.live_var = tk.BooleanVar(value=self.settings.get("live_feed", False))
+        ttk.Checkbutton(main, text="Live feed (keep pulling new captures until STOP)", variable=self.live_var).pack(anchor="w")
+        self.watch_var = tk.BooleanVar(value=self.settings.get("watch_mode", False))
+        ttk.Checkbutton(main, text="Watch mode (auto-sync new files when a known phone connects)",
+                        variable=self.watch_var, command=self.toggle_watch).pack(anchor="w")
         
         ctrl = ttk.Frame(main, padding=10)
         ctrl.pack(fill="x")
         self.btn_start = ttk.Button(ctrl, text="START", command=self.start)
         self.btn_start.pack(side="left", fill="x", expand=True, padx=5)
+        self.btn_plan = ttk.Button(ctrl, text="PLAN", command=self.plan)
+        self.btn_plan.pack(side="left", padx=5)
         self.btn_stop = ttk.Button(ctrl, text="STOP", command=self.stop, state="disabled")
         self.btn_stop.pack(side="right", fill="x", expand=True, padx=5)
 
@@ -264,15 +333,24 @@ class OSKCommanderPro(tk.Tk):
         self.settings["last_dest"] = self.local_var.get()
         CleanupDialog(self, self.settings, file_logger)
 
-    def log_msg(self, msg):
+    def log_msg(self, msg, to_file=True):
+        # Raw device names may carry undecodable bytes (surrogates); show them escaped
+        msg = msg.encode("utf-8", "backslashreplace").decode("utf-8")
         self.log.insert("end", msg+"\n")
         self.log.see("end")
-        if self.current_log_file:
+        if to_file and self.current_log_file:
             try:
                 with open(self.current_log_file, "a", encoding="utf-8") as f:
                     f.write(msg+"\n")
             except: pass
 
+    def _write_log_events(self, events):
+        """Log-file subscriber (background thread): one open per batch."""
+        if not self.current_log_file: return
+        with open(self.current_log_file, "a", encoding="utf-8") as f:
+            for e in events:
+                f.write(e.msg.encode("utf-8", "backslashreplace").decode("utf-8") + "\n")
+
     def copy_log(self):
         self.jump()
         try:
@@ -304,35 +382,132 @@ class OSKCommanderPro(tk.Tk):
         self.settings["last_dest"] = dest
         self.settings["remote_path"] = self.remote_var.get()
         self.settings["delete_after"] = self.del_var.get()
+        self.settings["verify_hash"] = self.hash_var.get()
+        self.settings["live_feed"] = self.live_var.get()
         save_settings(self.settings)
         
-        self.worker = SyncWorker(self.settings, self.queue)
+        self.worker = SyncWorker(self.settings, self.bus)
         self.worker.start()
         
         self.btn_start.config(state="disabled")
         self.btn_stop.config(state="normal")
 
+    def plan(self):
+        """Dry run: scan, filter and size-check without transferring anything."""
+        self.jump()
+        if self.worker: return
+        dest = self.local_var.get()
+        if not dest:
+            messagebox.showwarning("Missing Destination", "You must select a folder on your PC to save the files!")
+            return
+        config = dict(self.settings)
+        config.update(last_dest=dest, remote_path=self.remote_var.get(), delete_after=self.del_var.get(), dry_run=True, live_feed=False)
+        self.worker = SyncWorker(config, self.bus)
+        self.worker.start()
+        self.btn_start.config(state="disabled")
+
     def stop(self):
         if self.worker: self.worker.stop()
 
-    def _process_queue(self):
-        try:
-            while True:
-                msg = self.queue.get_nowait()
-                kind = msg[0]
-                if kind == "log": self.log_msg(msg[1])
-                elif kind == "progress": self.progress['value'] = msg[1]
-                elif kind == "wiggle_start": self.start_wiggle()
-                elif kind == "wiggle_stop": self.stop_wiggle()
-                elif kind == "jump": self.jump()
-                elif kind == "error": 
-                    messagebox.showerror("Error", msg[1])
-                    self._reset() 
-                elif kind == "done": 
-                    self.after(800, lambda: messagebox.showinfo("Done", "Complete"))
-                    self.after(800, self._reset)
-        except queue.Empty: pass
-        self.after(50, self._process_queue)
+    def toggle_watch(self):
+        self.settings["watch_mode"] = self.watch_var.get()
+        save_settings(self.settings)
+        if self.watch_var.get(): self.start_watch()
+        elif self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+            self.watch_pending = None
+            self.log_msg("[WATCH] Off.")
+
+    def start_watch(self):
+        if self.watcher: return
+        config = dict(self.settings)
+        config.update(last_dest=self.local_var.get(), remote_path=self.remote_var.get())
+        self.watcher = DeviceWatcher(config, self.bus)
+        self.watcher.start()
+        self.log_msg("[WATCH] Waiting for devices...")
+
+    def _on_device_state(self, e):
+        states = {"device": "Connected", "unauthorized": "Unauthorized", "offline": "Offline"}
+        self._show_usb_state(states.get(e.state, "No Device"))
+
+    def _on_watch_trigger(self, e):
+        if self.watch_run or self.worker is not None:
+            # Picked up once the current run is done (the worker is cleared in _reset,
+            # after its Done is handled, not when its thread exits)
+            self.watch_pending = e
+            return
+        self._start_watch_sync(e)
+
+    def _start_watch_sync(self, e):
+        """Unattended incremental sync of the device that just connected."""
+        dest = self.local_var.get()
+        if not dest:
+            self.log_msg("[WATCH] No PC destination set, not syncing.")
+            return
+        if not self.current_log_file:
+            ts = datetime.datetime.now().strftime("%Y-%m-%d_%H%M%S")
+            self.current_log_file = f"logs/osk_{ts}.txt"
+            self.log_msg(f"=== Watch sync {ts} ===")
+        config = dict(self.settings)
+        config.update(last_dest=dest, remote_path=self.remote_var.get(), delete_after=self.del_var.get(),
+                      verify_hash=self.hash_var.get(), serial=e.serial)
+        self.watch_run = e
+        self.worker = SyncWorker(config, self.bus)
+        self.worker.start()
+        self.btn_start.config(state="disabled")
+        self.btn_stop.config(state="normal")
+
+    def _process_events(self):
+        dispatch({
+            Log: lambda e: self.log_msg(e.msg, to_file=False),
+            Status: lambda e: self.log_msg(e.text, to_file=False),
+            Progress: lambda e: self.progress.config(value=e.pct),
+            WiggleStart: lambda e: self.start_wiggle(),
+            WiggleStop: lambda e: self.stop_wiggle(),
+            Jump: lambda e: self.jump(),
+            Error: self._on_error,
+            PlanDone: self._on_plan_done,
+            Throughput: self._on_throughput,
+            Done: self._on_done,
+            DeviceState: self._on_device_state,
+            WatchTrigger: self._on_watch_trigger,
+        }, self.ui_events.drain(), on_unknown=lambda e: self.log_msg(f"[UI] Unhandled event: {e}", to_file=False))
+        self.after(50, self._process_events)
+
+    def _on_error(self, e):
+        if self.watch_run:
+            # Unattended: no modal box, the next connect tries again
+            self.log_msg(f"[WATCH] Sync failed: {e.msg}")
+            self.watch_run = None
+            self._reset()
+            return
+        messagebox.showerror("Error", e.msg)
+        self._reset()
+
+    def _on_plan_done(self, e):
+        messagebox.showinfo("Sync Plan", e.text)
+        self._reset()
+
+    def _on_throughput(self, e):
+        self.settings["measured_bps"] = int(e.bytes_per_s)
+        save_settings(self.settings)
+
+    def _on_done(self, e):
+        if self.event_counter:
+            counts = self.event_counter.snapshot()
+            self.log_msg("[DEBUG] Events: " + ", ".join(f"{k} {v}" for k, v in sorted(counts.items())))
+        if self.watch_run:
+            run, self.watch_run = self.watch_run, None
+            # Only a run that synced its whole plan makes the folders "seen";
+            # otherwise the next connect checks them again
+            if self.watcher and e.complete:
+                self.watcher.commit(run.serial, run.signatures)
+            self.log_msg(f"[WATCH] Sync of {run.serial} done: {e.processed} file(s) in {e.elapsed}.")
+            self.after(800, self._reset)
+            return
+        self.after(800, lambda: messagebox.showinfo("Done", "Complete"))
+        self.after(800, self._reset)
 
     def _reset(self):
         self.stop_wiggle()
@@ -340,4 +515,8 @@ class OSKCommanderPro(tk.Tk):
         self.btn_stop.config(state="disabled")
         self.progress['value'] = 0
         self.update_idletasks()
-        self.worker = None
\ No newline at end of file
+        # Cleared first: the pending watch sync below starts a new worker
+        self.worker = None
+        if self.watch_pending and self.watcher:
+            pending, self.watch_pending = self.watch_pending, None
+            self._start_watch_sync(pending)
\ No newline at end of file
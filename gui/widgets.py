@@ -1,16 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
-import queue
 import os  # <--- FIXED: Added missing import
-from core.adb import AdbWrapper, check_adb_dlls
+from core.adb import check_adb_dlls
+from core.sources import make_source
 from core.worker import VerifyWorker
+from core.scheduling import SCHEDULERS
+from core.events import EventBus, VOLATILE, dispatch, Log, Status, Progress, Error, VerifyDone, DeletionDone
 
 class SettingsDialog(tk.Toplevel):
     def __init__(self, parent, current_settings):
         super().__init__(parent)
         self.title("Settings")
-        self.geometry("500x650")
+        self.geometry("500x640")
+        self.minsize(420, 300)
         self.settings = current_settings
         self.result = None
         self.create_widgets()
@@ -19,9 +22,16 @@ class SettingsDialog(tk.Toplevel):
 
     def create_widgets(self):
         pad = {'padx': 10, 'pady': 5}
-        
+
+        # Buttons first, so they keep their row however short the screen is
+        btn_frame = ttk.Frame(self, padding=10)
+        btn_frame.pack(fill="x", side="bottom")
+        ttk.Button(btn_frame, text="Save", command=self.save).pack(side="right")
+        ttk.Button(btn_frame, text="Cancel", command=self.destroy).pack(side="right", padx=5)
+        body = self._scroll_body()
+
         # ADB
-        lf_adb = ttk.LabelFrame(self, text="ADB Config", padding=10)
+        lf_adb = ttk.LabelFrame(body, text="ADB Config", padding=10)
         lf_adb.pack(fill="x", **pad)
         f_adb = ttk.Frame(lf_adb)
         f_adb.pack(fill="x")
@@ -33,26 +43,93 @@ class SettingsDialog(tk.Toplevel):
         self.lbl_dll.pack(anchor="w")
 
         # Sort & Limits
-        lf_gen = ttk.LabelFrame(self, text="General Processing", padding=10)
+        lf_gen = ttk.LabelFrame(body, text="General Processing", padding=10)
         lf_gen.pack(fill="x", **pad)
         
         f_s = ttk.Frame(lf_gen)
         f_s.pack(fill="x", pady=2)
         ttk.Label(f_s, text="Order:").pack(side="left")
         self.sort_var = tk.StringVar(value=self.settings.get("sort_order", "Oldest First"))
-        ttk.Combobox(f_s, textvariable=self.sort_var, values=["Oldest First", "Newest First", "Name (A-Z)", "Name (Z-A)"], state="readonly").pack(side="left", padx=5)
+        ttk.Combobox(f_s, textvariable=self.sort_var, values=list(SCHEDULERS), state="readonly").pack(side="left", padx=5)
         
+        f_src = ttk.Frame(lf_gen)
+        f_src.pack(fill="x", pady=2)
+        ttk.Label(f_src, text="Source:").pack(side="left")
+        self.source_var = tk.StringVar(value=self.settings.get("source_backend", "adb"))
+        ttk.Combobox(f_src, textvariable=self.source_var, values=["adb", "local"], state="readonly", width=8).pack(side="left", padx=5)
+        ttk.Label(f_src, text="(local: remote path is a folder on this PC, e.g. an SD card)", foreground="gray", font=("Segoe UI", 8)).pack(side="left")
+
+        f_lst = ttk.Frame(lf_gen)
+        f_lst.pack(fill="x", pady=2)
+        ttk.Label(f_lst, text="Listing:").pack(side="left")
+        self.backend_var = tk.StringVar(value=self.settings.get("listing_backend", "stat"))
+        ttk.Combobox(f_lst, textvariable=self.backend_var, values=["stat", "mediastore"], state="readonly", width=12).pack(side="left", padx=5)
+        ttk.Label(f_lst, text="Media folders:").pack(side="left")
+        self.media_folders_var = tk.StringVar(value=self.settings.get("media_folders", ""))
+        ttk.Entry(f_lst, textvariable=self.media_folders_var).pack(side="left", fill="x", expand=True, padx=5)
+        ttk.Label(lf_gen, text="(mediastore: ';' separated folders, empty = remote path)", foreground="gray", font=("Segoe UI", 8)).pack(anchor="w")
+
         self.smart_sort_var = tk.BooleanVar(value=self.settings.get("smart_sort", True))
-        ttk.Checkbutton(lf_gen, text="Smart Sort (YYYY-MM folders)", variable=self.smart_sort_var).pack(anchor="w")
+        f_ss = ttk.Frame(lf_gen)
+        f_ss.pack(fill="x")
+        ttk.Checkbutton(f_ss, text="Smart Sort (YYYY-MM folders)", variable=self.smart_sort_var).pack(side="left")
+        ttk.Label(f_ss, text="by").pack(side="left", padx=(10, 0))
+        self.date_source_var = tk.StringVar(value=self.settings.get("date_source", "mtime"))
+        ttk.Combobox(f_ss, textvariable=self.date_source_var, values=["mtime", "capture"], state="readonly", width=8).pack(side="left", padx=5)
+        ttk.Label(f_ss, text="Output:").pack(side="left", padx=(10, 0))
+        self.output_mode_var = tk.StringVar(value=self.settings.get("output_mode", "files"))
+        ttk.Combobox(f_ss, textvariable=self.output_mode_var, values=["files", "archive"], state="readonly", width=8).pack(side="left", padx=5)
 
         f_lim = ttk.Frame(lf_gen)
         f_lim.pack(fill="x", pady=2)
         ttk.Label(f_lim, text="Limit (0=All):").pack(side="left")
         self.limit_var = tk.IntVar(value=self.settings.get("limit_n", 0))
         ttk.Spinbox(f_lim, from_=0, to=9999, textvariable=self.limit_var, width=8).pack(side="left", padx=5)
+        ttk.Label(f_lim, text="If disk full:").pack(side="left", padx=(10, 0))
+        self.space_policy_var = tk.StringVar(value=self.settings.get("space_policy", "abort"))
+        ttk.Combobox(f_lim, textvariable=self.space_policy_var, values=["abort", "trim"], state="readonly", width=6).pack(side="left", padx=5)
+
+        f_par = ttk.Frame(lf_gen)
+        f_par.pack(fill="x", pady=2)
+        ttk.Label(f_par, text="Parallel pulls:").pack(side="left")
+        self.transfer_workers_var = tk.IntVar(value=self.settings.get("transfer_workers", 1))
+        ttk.Spinbox(f_par, from_=1, to=8, textvariable=self.transfer_workers_var, width=4).pack(side="left", padx=5)
+        ttk.Label(f_par, text="Placement workers:").pack(side="left", padx=(10, 0))
+        self.place_workers_var = tk.IntVar(value=self.settings.get("place_workers", 2))
+        ttk.Spinbox(f_par, from_=1, to=8, textvariable=self.place_workers_var, width=4).pack(side="left", padx=5)
+        self.autotune_var = tk.BooleanVar(value=self.settings.get("autotune", True))
+        ttk.Checkbutton(f_par, text="Auto-tune", variable=self.autotune_var).pack(side="left", padx=(10, 0))
+
+        f_scr = ttk.Frame(lf_gen)
+        f_scr.pack(fill="x", pady=2)
+        ttk.Label(f_scr, text="Scratch dir:").pack(side="left")
+        self.scratch_var = tk.StringVar(value=self.settings.get("scratch_dir", ""))
+        ttk.Entry(f_scr, textvariable=self.scratch_var).pack(side="left", fill="x", expand=True, padx=5)
+        ttk.Label(f_scr, text="Max MB:").pack(side="left")
+        self.scratch_limit_var = tk.IntVar(value=self.settings.get("scratch_limit_mb", 4096))
+        ttk.Spinbox(f_scr, from_=256, to=65536, increment=256, textvariable=self.scratch_limit_var, width=6).pack(side="left", padx=5)
+        ttk.Label(lf_gen, text="(scratch: local disk to pull to before copying to a slow/network destination)", foreground="gray", font=("Segoe UI", 8)).pack(anchor="w")
+
+        f_mir = ttk.Frame(lf_gen)
+        f_mir.pack(fill="x", pady=2)
+        ttk.Label(f_mir, text="Mirror to:").pack(side="left")
+        self.mirrors_var = tk.StringVar(value=";".join(self.settings.get("mirror_dests", [])))
+        ttk.Entry(f_mir, textvariable=self.mirrors_var).pack(side="left", fill="x", expand=True, padx=5)
+        ttk.Label(lf_gen, text="(';' separated extra backup folders, each gets a full copy)", foreground="gray", font=("Segoe UI", 8)).pack(anchor="w")
+
+        # Multi-folder sources
+        lf_src = ttk.LabelFrame(body, text="Sync Sources (one per line: /remote/folder > dest subfolder)", padding=10)
+        lf_src.pack(fill="x", **pad)
+        self.sources_txt = tk.Text(lf_src, height=3, font=("Consolas", 9))
+        self.sources_txt.pack(fill="x")
+        for src in self.settings.get("sources", []):
+            line = src.get("remote_path", "")
+            if src.get("dest"): line += f" > {src['dest']}"
+            self.sources_txt.insert("end", line + "\n")
+        ttk.Label(lf_src, text="(empty = only the remote path from the main window)", foreground="gray", font=("Segoe UI", 8)).pack(anchor="w")
 
         # Filters
-        lf_filt = ttk.LabelFrame(self, text="Filters (Include Only)", padding=10)
+        lf_filt = ttk.LabelFrame(body, text="Filters (Include Only)", padding=10)
         lf_filt.pack(fill="x", **pad)
 
         # Date Filter
@@ -81,14 +158,34 @@ class SettingsDialog(tk.Toplevel):
         ttk.Entry(f_let, textvariable=self.let_e_var, width=3).pack(side="left", padx=5)
 
         self.debug_var = tk.BooleanVar(value=self.settings.get("debug_mode", False))
-        ttk.Checkbutton(self, text="Debug Log", variable=self.debug_var).pack(anchor="w", padx=15)
+        ttk.Checkbutton(body, text="Debug Log", variable=self.debug_var).pack(anchor="w", padx=15)
+        self.trace_var = tk.BooleanVar(value=self.settings.get("trace", False))
+        ttk.Checkbutton(body, text="Save Trace (logs/trace_*.json)", variable=self.trace_var).pack(anchor="w", padx=15)
 
-        btn_frame = ttk.Frame(self, padding=10)
-        btn_frame.pack(fill="x", side="bottom")
-        ttk.Button(btn_frame, text="Save", command=self.save).pack(side="right")
-        ttk.Button(btn_frame, text="Cancel", command=self.destroy).pack(side="right", padx=5)
         self.validate_adb()
 
+    def _scroll_body(self):
+        """Scrollable area for the options; returns the frame to fill."""
+        canvas = tk.Canvas(self, highlightthickness=0)
+        bar = ttk.Scrollbar(self, orient="vertical", command=canvas.yview)
+        canvas.configure(yscrollcommand=bar.set)
+        bar.pack(side="right", fill="y")
+        canvas.pack(side="left", fill="both", expand=True)
+        body = ttk.Frame(canvas)
+        window = canvas.create_window((0, 0), window=body, anchor="nw")
+        body.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+        canvas.bind("<Configure>", lambda e: canvas.itemconfigure(window, width=e.width))
+        # The dialog is modal, so the wheel can be bound app-wide while it is open
+        wheel_events = ("<MouseWheel>", "<Button-4>", "<Button-5>")
+        def wheel(e):
+            canvas.yview_scroll(-1 if (e.num == 4 or e.delta > 0) else 1, "units")
+        def unbind(e):
+            if e.widget is not self: return
+            for seq in wheel_events: self.unbind_all(seq)
+        for seq in wheel_events: self.bind_all(seq, wheel)
+        self.bind("<Destroy>", unbind)
+        return body
+
     def browse_adb(self):
         f = filedialog.askopenfilename(filetypes=[("ADB", "adb.exe")])
         if f: self.adb_var.set(f)
@@ -107,13 +204,41 @@ class SettingsDialog(tk.Toplevel):
         else:
             self.lbl_dll.config(text="ADB OK", foreground="green")
 
+    def parse_sources(self):
+        # Keep per-source overrides (filters, labels) that were set in the JSON
+        old = {s.get("remote_path"): s for s in self.settings.get("sources", [])}
+        sources = []
+        for line in self.sources_txt.get("1.0", "end").splitlines():
+            if not line.strip(): continue
+            remote, _, dest = line.partition(">")
+            remote = remote.strip()
+            src = dict(old.get(remote, {}))
+            src["remote_path"] = remote
+            src["dest"] = dest.strip()
+            sources.append(src)
+        return sources
+
     def save(self):
         self.result = {
+            "sources": self.parse_sources(),
             "adb_path": self.adb_var.get(),
             "limit_n": self.limit_var.get(),
+            "space_policy": self.space_policy_var.get(),
+            "transfer_workers": self.transfer_workers_var.get(),
+            "place_workers": self.place_workers_var.get(),
+            "autotune": self.autotune_var.get(),
+            "scratch_dir": self.scratch_var.get().strip(),
+            "scratch_limit_mb": self.scratch_limit_var.get(),
+            "mirror_dests": [d.strip() for d in self.mirrors_var.get().split(";") if d.strip()],
             "debug_mode": self.debug_var.get(),
+            "trace": self.trace_var.get(),
             "smart_sort": self.smart_sort_var.get(),
+            "output_mode": self.output_mode_var.get(),
+            "date_source": self.date_source_var.get(),
             "sort_order": self.sort_var.get(),
+            "source_backend": self.source_var.get(),
+            "listing_backend": self.backend_var.get(),
+            "media_folders": self.media_folders_var.get(),
             "filter_enable_date": self.use_date_var.get(),
             "filter_date_start": self.date_s_var.get(),
             "filter_date_end": self.date_e_var.get(),
@@ -131,13 +256,19 @@ class CleanupDialog(tk.Toplevel):
         self.geometry("600x500")
         self.settings = settings
         self.main_logger = main_logger
-        self.queue = queue.Queue()
+        self.bus = EventBus()
+        # No wiggle / jump in this dialog: those events are not subscribed
+        self.ui_events = self.bus.subscribe(kinds=(Log, Status, Progress, Error, VerifyDone, DeletionDone),
+                                            coalesce=VOLATILE, batch=500)
         self.worker = None
         self.safe_files = [] 
+        self.safe_records = []
+        self.del_stop = threading.Event()
+        self.del_source = None
         self.create_widgets()
         self.transient(parent)
         self.start_scan()
-        self.after(100, self.process_queue)
+        self.after(100, self.process_events)
 
     def create_widgets(self):
         main = ttk.Frame(self, padding=10)
@@ -155,8 +286,23 @@ class CleanupDialog(tk.Toplevel):
         self.btn_delete = ttk.Button(self.btn_frame, text="DELETE SAFE FILES", command=self.delete_safe_files, state="disabled")
         self.btn_delete.pack(side="right")
         ttk.Button(self.btn_frame, text="Close", command=self.destroy).pack(side="right", padx=10)
+        self.btn_stop = ttk.Button(self.btn_frame, text="Stop", command=self.stop)
+        self.btn_stop.pack(side="left")
+        self.protocol("WM_DELETE_WINDOW", self.destroy)
+
+    def stop(self):
+        """Kills the running verify scan or deletion batch."""
+        if self.worker: self.worker.stop()
+        self.del_stop.set()
+        if self.del_source: self.del_source.cancel()
+
+    def destroy(self):
+        self.stop()
+        super().destroy()
 
     def log_msg(self, msg):
+        # Raw device names may carry undecodable bytes (surrogates); show them escaped
+        msg = msg.encode("utf-8", "backslashreplace").decode("utf-8")
         self.log.config(state="normal")
         self.log.insert("end", f"{msg}\n")
         self.log.see("end")
@@ -165,7 +311,7 @@ class CleanupDialog(tk.Toplevel):
             self.main_logger(f"[CLEANUP] {msg}")
 
     def start_scan(self):
-        self.worker = VerifyWorker(self.settings, self.queue)
+        self.worker = VerifyWorker(self.settings, self.bus)
         self.worker.start()
 
     def delete_safe_files(self):
@@ -173,50 +319,75 @@ class CleanupDialog(tk.Toplevel):
         if count == 0: return
         if not messagebox.askyesno("Confirm", f"Delete {count} verified files from phone?"): return
         self.btn_delete.config(state="disabled")
+        self.btn_stop.config(state="normal")
+        self.del_stop.clear()
         self.log_msg("--- STARTING DELETION ---")
-        threading.Thread(target=self.run_deletion, args=(self.settings["adb_path"], self.settings["remote_path"].rstrip("/")), daemon=True).start()
+        threading.Thread(target=self.run_deletion, daemon=True).start()
 
-    def run_deletion(self, adb, base):
-        batch_size = 20
-        total = len(self.safe_files)
-        def log_adapter(msg): self.queue.put(("log", msg))
-        wrapper = AdbWrapper(adb, logger=log_adapter)
-        
-        for i in range(0, total, batch_size):
-            batch = self.safe_files[i:i+batch_size]
-            log_adapter(f"[DEL_BATCH] {', '.join(batch)}")
-            
-            args = ["shell", "cd", f"'{base}'", "&&", "rm"] + [f"'{f}'" for f in batch]
-            wrapper.run(args)
-            
-            current_done = min(i + batch_size, total)
-            self.queue.put(("log", f"Deleted {current_done}/{total}..."))
-        
-        self.queue.put(("log", "--- DELETION COMPLETE ---"))
-        wrapper.scan_media()
-        self.queue.put(("deletion_done",))
-
-    def process_queue(self):
-        try:
-            while True:
-                msg = self.queue.get_nowait()
-                kind = msg[0]
-                if kind == "log": self.log_msg(msg[1])
-                elif kind == "progress":
-                    self.progress['value'] = msg[1]
-                    self.lbl_status.config(text=msg[2])
-                elif kind == "error": self.log_msg(f"ERROR: {msg[1]}")
-                elif kind == "wiggle_start": pass 
-                elif kind == "wiggle_stop": pass
-                elif kind == "jump": pass
-                elif kind == "verify_done":
-                    total, matched, files = msg[1], msg[2], msg[3]
-                    self.safe_files = files
-                    self.log_msg(f"Safe to delete: {matched} / {total}")
-                    if matched > 0: self.btn_delete.config(state="normal", text=f"DELETE {matched} FILES")
-                    else: self.btn_delete.config(text="Nothing to delete")
-                elif kind == "deletion_done":
-                    messagebox.showinfo("Success", "Cleanup complete.")
-                    self.btn_delete.config(text="Deletion Complete", state="disabled")
-        except queue.Empty: pass
-        self.after(100, self.process_queue)
\ No newline at end of file
+    def run_deletion(self):
+        # Size/mtime of every file are re-checked right before it is removed
+        # (on a phone by one device shell for the whole list)
+        total = len(self.safe_records)
+        done = [0]
+        def log_adapter(msg): self.bus.publish(Log(msg))
+        def on_result(path, status):
+            done[0] += 1
+            name = os.path.basename(path)
+            log_adapter(f"[{status}] {name}" if status != "DELETED" else f"[DEL] {name}")
+            self.bus.publish(Progress(done[0] / total * 100, f"Deleted {done[0]}/{total}"))
+        source = make_source(self.settings, log_adapter)
+        self.del_source = source
+        deleter = source.deleter(on_result)
+
+        failed_at = None
+        for i, (path, size, mtime) in enumerate(self.safe_records):
+            if self.del_stop.is_set():
+                self.bus.publish(Log(f"[STOP] Deletion stopped at {i}/{total}."))
+                break
+            if not deleter.submit(path, size, mtime):
+                failed_at = i
+                break
+        left = deleter.close()
+        if left: self.bus.publish(Log(f"{len(left)} file(s) got no answer from the phone and were kept."))
+        counts = deleter.results
+        if failed_at is not None:
+            self.bus.publish(Error(f"The delete shell on the phone is not available (device disconnected?).\n"
+                                   f"{counts['DELETED']} deleted, {total - failed_at} file(s) not processed and kept."))
+        else:
+            self.bus.publish(Log(f"--- DELETION COMPLETE: {counts['DELETED']} deleted, "
+                                 f"{counts['CHANGED']} changed (kept), {counts['GONE']} already gone ---"))
+        source.reset_cancel()
+        source.after_delete()
+        self.bus.publish(DeletionDone())
+
+    def process_events(self):
+        dispatch({
+            Log: lambda e: self.log_msg(e.msg),
+            Status: lambda e: self.lbl_status.config(text=e.text),
+            Progress: self._on_progress,
+            Error: self._on_error,
+            VerifyDone: self._on_verify_done,
+            DeletionDone: self._on_deletion_done,
+        }, self.ui_events.drain(), on_unknown=lambda e: self.log_msg(f"[UI] Unhandled event: {e}"))
+        self.after(100, self.process_events)
+
+    def _on_error(self, e):
+        self.log_msg(f"ERROR: {e.msg}")
+        messagebox.showerror("Error", e.msg, parent=self)
+
+    def _on_progress(self, e):
+        self.progress['value'] = e.pct
+        self.lbl_status.config(text=e.text)
+
+    def _on_verify_done(self, e):
+        self.btn_stop.config(state="disabled")
+        self.safe_files = e.files
+        self.safe_records = e.records
+        self.log_msg(f"Safe to delete: {e.matched} / {e.total}")
+        if e.matched > 0: self.btn_delete.config(state="normal", text=f"DELETE {e.matched} FILES")
+        else: self.btn_delete.config(text="Nothing to delete")
+
+    def _on_deletion_done(self, e):
+        self.btn_stop.config(state="disabled")
+        messagebox.showinfo("Success", "Cleanup complete.")
+        self.btn_delete.config(text="Deletion Complete", state="disabled")
\ No newline at end of file
@@ -1,5 +1,9 @@
+import time
+_T0 = time.perf_counter()
+
 import sys
 import os
+from core.timing import StartupTimer
 from gui.main_window import OSKCommanderPro
 
 # Fix for PyInstaller path resolution
@@ -24,5 +28,7 @@ if __name__ == "__main__":
         # We are running as an exe
         os.environ["PATH"] += os.pathsep + sys._MEIPASS
         
-    app = OSKCommanderPro()
+    timer = StartupTimer(_T0)
+    timer.mark("imports")
+    app = OSKCommanderPro(timer)
     app.mainloop()
\ No newline at end of file